@@ -1,7 +1,11 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import cv2
 import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ImageProcessor"))
+from transforms import transform_cache
 
 
 # Rotate an image
@@ -23,47 +27,49 @@ def rotate_image(
     """
     # Retrieve height and width of the image from the shape
     (h, w) = image.shape[:2]
-    # calculate the center point for the rotation as integer
-    # here: width first, as that's what cv2 accepts as pont format(x, y)
-    # cf. https://opencv.org/blog/image-rotation-and-translation-using-opencv/
-    center = (w // 2, h // 2)
-    scale = 1
-    new_canvas_size = (w, h)
-    # convert angle to radians as input for trigonometric functions
-    theta = math.radians(angle) 
-
-    if resize_canvas:
-        # Calculate the new image size
-        # cf. https://math.stackexchange.com/questions/430763/size-of-new-box-rotated-and-the-rescaled
-        # 𝑤′=𝑤cos𝜃+ℎsin𝜃
-        # ℎ′=𝑤sin𝜃+ℎcos𝜃
-        new_w = abs(w * math.cos(theta)) + abs(h * math.sin(theta))
-        new_h = abs(w * math.sin(theta)) + abs(h * math.cos(theta))
-        new_canvas_size = (int(round(new_w)), int(round(new_h)))
-    else:
-        # cf. https://stackoverflow.com/questions/33866535/how-to-scale-a-rotated-rectangle-to-always-fit-another-rectangle
-        wr = abs(w * math.cos(theta)) + abs(h * math.sin(theta))
-        hr = abs(w * math.sin(theta)) + abs(h * math.cos(theta))
-        scale = min(w / wr, h / hr)
-
-        # This is still wrong, I need to also center the scaled image
-        # wr_scaled = wr * scale
-        # hr_scaled = hr * scale
-        # tx = (w - wr_scaled) / 2
-        # ty = (h - hr_scaled) / 2
-        # rotation_matrix[0, 2] += tx
-        # rotation_matrix[1, 2] += ty
-
-    # get the rotation matrix
-    rotation_matrix = cv2.getRotationMatrix2D(center, angle, scale)
+
+    def build():
+        # calculate the center point for the rotation as integer
+        # here: width first, as that's what cv2 accepts as pont format(x, y)
+        # cf. https://opencv.org/blog/image-rotation-and-translation-using-opencv/
+        center = (w // 2, h // 2)
+        scale = 1
+        new_canvas_size = (w, h)
+        # convert angle to radians as input for trigonometric functions
+        theta = math.radians(angle) 
+
+        if resize_canvas:
+            # Calculate the new image size
+            # cf. https://math.stackexchange.com/questions/430763/size-of-new-box-rotated-and-the-rescaled
+            # 𝑤′=𝑤cos𝜃+ℎsin𝜃
+            # ℎ′=𝑤sin𝜃+ℎcos𝜃
+            new_w = abs(w * math.cos(theta)) + abs(h * math.sin(theta))
+            new_h = abs(w * math.sin(theta)) + abs(h * math.cos(theta))
+            new_canvas_size = (int(round(new_w)), int(round(new_h)))
+        else:
+            # cf. https://stackoverflow.com/questions/33866535/how-to-scale-a-rotated-rectangle-to-always-fit-another-rectangle
+            wr = abs(w * math.cos(theta)) + abs(h * math.sin(theta))
+            hr = abs(w * math.sin(theta)) + abs(h * math.cos(theta))
+            scale = min(w / wr, h / hr)
+
+            # This is still wrong, I need to also center the scaled image
+            # wr_scaled = wr * scale
+            # hr_scaled = hr * scale
+            # tx = (w - wr_scaled) / 2
+            # ty = (h - hr_scaled) / 2
+            # rotation_matrix[0, 2] += tx
+            # rotation_matrix[1, 2] += ty
+
+        # get the rotation matrix
+        rotation_matrix = cv2.getRotationMatrix2D(center, angle, scale)
+        return rotation_matrix, new_canvas_size
+
+    # The transform only depends on the image size, angle and canvas mode,
+    # so it is computed once and reused for all frames of the same size
+    transform = transform_cache.get(("rotate_image", h, w, float(angle), resize_canvas), build)
     # warp (apply) the affine transformation
-    rotated_image = cv2.warpAffine(
-        image, 
-        rotation_matrix, 
-        new_canvas_size, 
-        borderValue=(bg_color_rgb[2], bg_color_rgb[1], bg_color_rgb[0])
-        )
-    
+    rotated_image = transform.apply(image, (bg_color_rgb[2], bg_color_rgb[1], bg_color_rgb[0]))
+
     return rotated_image
 
 
@@ -307,6 +313,9 @@ def app():
         bottomright_y=1950
         )
     
+    # DISPLAY (matplotlib is only needed here, not by the functions above)
+    
+    import matplotlib.pyplot as plt
     fix, ax = plt.subplots(1,5, figsize=(20, 5))
     ax[0].imshow(image)
     ax[1].imshow(image_resized)
@@ -0,0 +1,153 @@
+
+import asyncio
+import threading
+from concurrent.futures import Executor
+
+from ImgProc import ImageProcessor, ImageProcessorError
+from pools import get_executor
+
+
+class AsyncImageProcessor:
+    """
+    Asyncio wrapper around ImageProcessor. Loading, processing and saving run on an
+    executor, so the event loop stays responsive.
+
+    Operations are queued and run together in one executor job when the processor is awaited:
+
+        processor = await AsyncImageProcessor.open("fruits.jpg")
+        await processor.resize(scale=0.5).rotate(angle=30).crop(x1=0, y1=0, width=200, height=200)
+        await processor.save("result.jpg")
+    """
+
+    def __init__(self, processor: ImageProcessor, executor: Executor | None = None, semaphore: asyncio.Semaphore | None = None):
+        """
+        Args:
+            processor (ImageProcessor): The wrapped processor
+            executor (Executor, optional): Executor for the blocking work, default is the shared pool
+            semaphore (asyncio.Semaphore, optional): Limits how many jobs run at the same time,
+                can be shared between processors
+        """
+        if not isinstance(processor, ImageProcessor):
+            raise ImageProcessorError("processor must be an ImageProcessor.")
+        self.processor = processor
+        self.executor = executor
+        self.semaphore = semaphore
+        self._pending = []
+
+    @classmethod
+    async def open(cls, image_path: str, executor: Executor | None = None, semaphore: asyncio.Semaphore | None = None) -> "AsyncImageProcessor":
+        """
+        Load an image without blocking the event loop.
+
+        Args:
+            image_path (str): Path to the image file
+            executor (Executor, optional): Executor for the blocking work, default is the shared pool
+            semaphore (asyncio.Semaphore, optional): Limits how many jobs run at the same time
+        """
+        processor = await _run_job(lambda cancelled: ImageProcessor(image_path), executor, semaphore)
+        return cls(processor, executor, semaphore)
+
+    @property
+    def image(self):
+        return self.processor.image
+
+    def _queue(self, name: str, *args, **kwargs) -> "AsyncImageProcessor":
+        self._pending.append((name, args, kwargs))
+        return self
+
+    def resize(self, new_width: int | None = None, new_height: int | None = None, scale: float | None = None) -> "AsyncImageProcessor":
+        """Queue ImageProcessor.resize."""
+        return self._queue("resize", new_width, new_height, scale)
+
+    def rotate(self, angle: float = 0, resize_canvas: bool = True, bg_color_rgb: tuple[int, int, int] = (0, 0, 0)) -> "AsyncImageProcessor":
+        """Queue ImageProcessor.rotate."""
+        return self._queue("rotate", angle, resize_canvas, bg_color_rgb)
+
+    def crop(self, x1: int, y1: int, width: int | None = None, height: int | None = None, x2: int | None = None, y2: int | None = None) -> "AsyncImageProcessor":
+        """Queue ImageProcessor.crop."""
+        return self._queue("crop", x1, y1, width, height, x2, y2)
+
+    def draw_circle(self, center: tuple[int, int], radius: int, color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2) -> "AsyncImageProcessor":
+        """Queue ImageProcessor.draw_circle."""
+        return self._queue("draw_circle", center, radius, color_rgb, thickness)
+
+    def draw_rectangle(self, top_left: tuple[int, int], bottom_right: tuple[int, int], color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2) -> "AsyncImageProcessor":
+        """Queue ImageProcessor.draw_rectangle."""
+        return self._queue("draw_rectangle", top_left, bottom_right, color_rgb, thickness)
+
+    def annotate(self, text: str, position: tuple[int, int], font_scale: float = 1.0, color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2) -> "AsyncImageProcessor":
+        """Queue ImageProcessor.annotate."""
+        return self._queue("annotate", text, position, font_scale, color_rgb, thickness)
+
+    async def run(self) -> "AsyncImageProcessor":
+        """
+        Run all queued operations in one executor job.
+
+        If the awaiting task is cancelled, the operation that is currently running
+        finishes and the remaining ones are dropped. The image then reflects the
+        operations that completed.
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return self
+
+        def job(cancelled: threading.Event):
+            for name, args, kwargs in pending:
+                if cancelled.is_set():
+                    return
+                getattr(self.processor, name)(*args, **kwargs)
+
+        await _run_job(job, self.executor, self.semaphore)
+        return self
+
+    def __await__(self):
+        return self.run().__await__()
+
+    async def save(self, image_path: str, **options):
+        """
+        Run the queued operations, then save the image without blocking the event loop.
+
+        Args:
+            image_path (str): Path of the file to write
+            **options: Encoding options, see encoding.build_params
+        """
+        await self.run()
+        await _run_job(lambda cancelled: self.processor.save(image_path, **options), self.executor, self.semaphore)
+
+    async def to_bytes(self, format: str = "jpeg", **options) -> memoryview:
+        """
+        Run the queued operations, then encode the image without blocking the event loop.
+
+        Args:
+            format (str): "jpeg", "png", "webp" or another format OpenCV can write
+            **options: Encoding options, see encoding.build_params
+        """
+        await self.run()
+        return await _run_job(lambda cancelled: self.processor.to_bytes(format, **options), self.executor, self.semaphore)
+
+
+async def _run_job(job, executor: Executor | None, semaphore: asyncio.Semaphore | None):
+    """
+    Run job(cancelled_event) on the executor, holding the semaphore while it runs.
+    """
+    if semaphore is None:
+        return await _run_in_executor(job, executor)
+    async with semaphore:
+        return await _run_in_executor(job, executor)
+
+
+async def _run_in_executor(job, executor: Executor | None):
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    future = loop.run_in_executor(executor or get_executor(), job, cancelled)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # A running thread can't be stopped. Ask the job to stop at the next
+        # operation and wait for it, so the semaphore really bounds the running jobs.
+        cancelled.set()
+        await asyncio.wait([future])
+        if not future.cancelled():
+            # Mark a possible error as seen, the caller only gets the cancellation
+            future.exception()
+        raise
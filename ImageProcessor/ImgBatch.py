@@ -0,0 +1,381 @@
+
+import numpy as np
+import cv2
+import encoding
+import transforms
+from ImgProc import ImageProcessorError
+from instrumentation import timed
+from pools import get_executor
+
+
+def _validate_color(color_rgb, name: str = "color_rgb"):
+    if not isinstance(color_rgb, tuple) or len(color_rgb) != 3:
+        raise ImageProcessorError(f"{name} must be a tuple of three integers.")
+    for c in color_rgb:
+        if not isinstance(c, int) or not (0 <= c <= 255):
+            raise ImageProcessorError("RGB values must be integers in range 0..255.")
+
+
+def _validate_point(point, name: str):
+    if not isinstance(point, tuple) or len(point) != 2:
+        raise ImageProcessorError(f"{name} must be a tuple of two integers.")
+    if not all(isinstance(c, int) and c >= 0 for c in point):
+        raise ImageProcessorError(f"{name} coordinates must be non-negative integers.")
+
+
+class ImageBatch:
+
+    def __init__(self, images: np.ndarray):
+        """
+        Initializes the ImageBatch with a stack of equally sized RGB images.
+
+        Args:
+            images (np.ndarray): Array of shape (N, H, W, C) or (N, H, W)
+        """
+        if not isinstance(images, np.ndarray) or images.ndim not in (3, 4):
+            raise ImageProcessorError("images must be a numpy array of shape (N, H, W, C) or (N, H, W).")
+        if images.shape[0] == 0:
+            raise ImageProcessorError("images must contain at least one image.")
+        # Starts as one contiguous block. crop() later narrows it to a strided view, which
+        # is still a valid cv::Mat per image (rows with a step), so nothing is copied.
+        self.images = np.ascontiguousarray(images)
+
+    @classmethod
+    def from_files(cls, image_paths: list[str]) -> "ImageBatch":
+        """
+        Load equally sized images from files. Images are decoded in parallel,
+        straight into the batch array, and converted to RGB.
+
+        Args:
+            image_paths (list[str]): Paths of the image files
+        """
+        if not isinstance(image_paths, (list, tuple)) or not image_paths:
+            raise ImageProcessorError("image_paths must be a non-empty list of paths.")
+
+        def load(path):
+            try:
+                image = cv2.imread(path)
+            except cv2.error as e:
+                raise ImageProcessorError(f"Could not load image from path: {path}") from e
+            if image is None:
+                raise ImageProcessorError(f"Could not load image from path: {path}")
+            return image
+
+        first = load(image_paths[0])
+        images = np.empty((len(image_paths),) + first.shape, dtype=first.dtype)
+        cv2.cvtColor(first, cv2.COLOR_BGR2RGB, dst=images[0])
+
+        def load_into(i):
+            image = load(image_paths[i])
+            if image.shape != first.shape:
+                raise ImageProcessorError(f"All images must have the same size: {image_paths[i]}")
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=images[i])
+
+        # list() re-raises the first error of a worker
+        list(get_executor().map(load_into, range(1, len(image_paths))))
+        return cls(images)
+
+    @classmethod
+    def from_video(cls, video_path: str, start: int = 0, stop: int | None = None, step: int = 1) -> "ImageBatch":
+        """
+        Load the frames start, start + step, ... (up to stop, exclusive) of a video.
+
+        Args:
+            video_path (str): Path of the video file
+            start (int): Index of the first frame
+            stop (int, optional): Index after the last frame, default is the frame count
+                reported by the video container
+            step (int): Take every step-th frame
+        """
+        if not isinstance(start, int) or start < 0:
+            raise ImageProcessorError("start must be a non-negative integer.")
+        if stop is not None and (not isinstance(stop, int) or stop <= start):
+            raise ImageProcessorError("stop must be an integer greater than start.")
+        if not isinstance(step, int) or step <= 0:
+            raise ImageProcessorError("step must be a positive integer.")
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ImageProcessorError(f"Could not open video: {video_path}")
+        try:
+            if stop is None:
+                # The frame count in the container header can be missing or a bit off
+                stop = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), start + 1)
+            if start > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            count = len(range(start, stop, step))
+            images = None
+            n = 0
+            frame_id = start
+            while n < count:
+                if (frame_id - start) % step == 0:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if images is None:
+                        # The size is only known after the first frame
+                        images = np.empty((count,) + frame.shape, dtype=frame.dtype)
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=images[n])
+                    n += 1
+                elif not cap.grab():
+                    # grab() skips decoding the frames that are not needed
+                    break
+                frame_id += 1
+        finally:
+            cap.release()
+        if images is None:
+            raise ImageProcessorError(f"Could not read frame {start} of video: {video_path}")
+        # A leading slice of a contiguous array is still contiguous
+        return cls(images[:n])
+
+    def __len__(self) -> int:
+        return self.images.shape[0]
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.images[index]
+
+    def _map_into(self, fn, out_shape: tuple[int, ...]):
+        """
+        Run fn(image, out) for every image on the thread pool and replace the batch
+        with the preallocated output.
+        """
+        out = np.empty((len(self),) + out_shape + self.images.shape[3:], dtype=self.images.dtype)
+        list(get_executor().map(lambda i: fn(self.images[i], out[i]), range(len(self))))
+        self.images = out
+
+    @timed("imgbatch.resize")
+    def resize(self, new_width: int | None = None, new_height: int | None = None, scale: float | None = None):
+        """
+        Resizes all images to the specified width and height.
+
+        Args:
+            new_width (int): The desired width of the images
+            new_height (int): The desired height of the images
+            scale (float): Scaling factor to resize the images
+        """
+        if new_width is not None and new_height is not None:
+            try:
+                new_width = int(new_width)
+                new_height = int(new_height)
+            except ValueError:
+                raise ImageProcessorError("Width and height must be positive integers.")
+            if new_width <= 0 or new_height <= 0:
+                raise ImageProcessorError("Width and height must be positive integers.")
+        elif scale is not None:
+            try:
+                scale = float(scale)
+            except ValueError:
+                raise ImageProcessorError("Scale must be a positive number.")
+            if scale <= 0:
+                raise ImageProcessorError("Scale must be a positive number.")
+            new_width = int(self.images.shape[2] * scale)
+            new_height = int(self.images.shape[1] * scale)
+        else:
+            return
+        self._map_into(
+            lambda image, out: cv2.resize(image, (new_width, new_height), dst=out),
+            (new_height, new_width)
+        )
+
+    @timed("imgbatch.rotate")
+    def rotate(
+        self,
+        angle: float = 0,
+        resize_canvas: bool = True,
+        bg_color_rgb: tuple[int, int, int] = (0, 0, 0)
+    ):
+        """
+        Rotate all images. Same arguments and result as ImageProcessor.rotate,
+        but the transform is only computed once for the whole batch.
+
+        Args:
+            angle (float): rotation angle in degrees of a 360 degree circle
+            resize_canvas (bool):
+                True if original image size is kept and canvas changes,
+                False if canvas stays and image is scaled to fit
+            bg_color_rgb (tuple[int, int, int]): Colour for new background pixels (RGB)
+        """
+        if not isinstance(angle, (int, float)):
+            raise ImageProcessorError("angle must be a number.")
+        if not isinstance(resize_canvas, bool):
+            raise ImageProcessorError("resize_canvas must be a boolean.")
+        if not isinstance(bg_color_rgb, tuple):
+            raise ImageProcessorError("bg_color_rgb must be a tuple")
+        if len(bg_color_rgb) != 3:
+            raise ImageProcessorError("bg_color_rgb must be a 3-tuple")
+        for c in bg_color_rgb:
+            if not isinstance(c, int):
+                raise ImageProcessorError("RGB values must be integers")
+            if not (0 <= c <= 255):
+                raise ImageProcessorError("RGB values must be in range 0..255")
+        canvas = transforms.EXPAND if resize_canvas else transforms.FIT
+        transform = transforms.transform_cache.rotation(self.images.shape[1:3], angle, canvas=canvas)
+        (nW, nH) = transform.size
+        self._map_into(lambda image, out: transform.apply(image, bg_color_rgb, dst=out), (nH, nW))
+
+    def crop(self, x1: int, y1: int, width: int | None = None, height: int | None = None, x2: int | None = None, y2: int | None = None):
+        """
+        Crop all images to the specified rectangle. The result is a view into the
+        batch, no pixels are copied.
+
+        Args:
+            x1 (int): The x-coordinate of the top-left corner
+            y1 (int): The y-coordinate of the top-left corner
+            width (int, optional): The width of the crop rectangle
+            height (int, optional): The height of the crop rectangle
+            x2 (int, optional): The x-coordinate of the bottom-right corner
+            y2 (int, optional): The y-coordinate of the bottom-right corner
+        """
+        if not isinstance(x1, int) or not isinstance(y1, int) or x1 < 0 or y1 < 0:
+            raise ImageProcessorError("x1 and y1 must be non-negative integers.")
+        if width is not None and (not isinstance(width, int) or width < 0):
+            raise ImageProcessorError("width must be a non-negative integer.")
+        if height is not None and (not isinstance(height, int) or height < 0):
+            raise ImageProcessorError("height must be a non-negative integer.")
+        if x2 is not None and (not isinstance(x2, int) or x2 <= x1):
+            raise ImageProcessorError("x2 must be an integer greater than x1.")
+        if y2 is not None and (not isinstance(y2, int) or y2 <= y1):
+            raise ImageProcessorError("y2 must be an integer greater than y1.")
+        if width is not None and height is not None:
+            x2 = x1 + width
+            y2 = y1 + height
+        elif x2 is not None and y2 is not None:
+            pass
+        else:
+            raise ImageProcessorError("Either width and height or x2 and y2 must be provided for cropping.")
+
+        self.images = self.images[:, y1:y2, x1:x2]
+
+    def _paint(self, draw, color_rgb: tuple[int, int, int]):
+        """
+        Draw a shape once into a mask and paint the masked pixels of all images
+        with a single numpy assignment, instead of one OpenCV call per image.
+        """
+        mask = np.zeros(self.images.shape[1:3], dtype=np.uint8)
+        draw(mask)
+        if self.images.ndim == 4:
+            # Like OpenCV, extra channels (alpha) get 0 and missing ones are dropped
+            color = np.zeros(self.images.shape[3], dtype=self.images.dtype)
+            n = min(len(color_rgb), len(color))
+            color[:n] = color_rgb[:n]
+            self.images[:, mask != 0] = color
+        else:
+            # Grey scale images: OpenCV would use the first channel of the colour
+            self.images[:, mask != 0] = color_rgb[0]
+
+    def draw_circle(self, center: tuple[int, int], radius: int, color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2):
+        """
+        Draw a circle on all images.
+
+        Args:
+            center (tuple[int, int]): The (x, y) coordinates of the circle's center
+            radius (int): The radius of the circle
+            color_rgb (tuple[int, int, int]): The color of the circle in RGB format
+            thickness (int): The thickness of the circle's outline. Use -1 for filled circle.
+        """
+        if not isinstance(center, tuple) or len(center) != 2:
+            raise ImageProcessorError("center must be a tuple of two integers.")
+        if not all(isinstance(c, int) and c >= 0 for c in center):
+            raise ImageProcessorError("center coordinates must be non-negative integers.")
+        if not isinstance(radius, int) or radius <= 0:
+            raise ImageProcessorError("radius must be a positive integer.")
+        _validate_color(color_rgb)
+        if not isinstance(thickness, int):
+            raise ImageProcessorError("thickness must be an integer.")
+
+        self._paint(lambda mask: cv2.circle(mask, center, radius, 255, thickness), color_rgb)
+
+    def draw_rectangle(self, top_left: tuple[int, int], bottom_right: tuple[int, int], color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2):
+        """
+        Draw a rectangle on all images.
+
+        Args:
+            top_left (tuple[int, int]): The (x, y) coordinates of the top-left corner
+            bottom_right (tuple[int, int]): The (x, y) coordinates of the bottom-right corner
+            color_rgb (tuple[int, int, int]): The color of the rectangle in RGB format
+            thickness (int): The thickness of the rectangle's outline. Use -1 for filled rectangle.
+        """
+        if not isinstance(top_left, tuple) or len(top_left) != 2:
+            raise ImageProcessorError("top_left must be a tuple of two integers.")
+        if not isinstance(bottom_right, tuple) or len(bottom_right) != 2:
+            raise ImageProcessorError("bottom_right must be a tuple of two integers.")
+        if not all(isinstance(c, int) and c >= 0 for c in top_left + bottom_right):
+            raise ImageProcessorError("corner coordinates must be non-negative integers.")
+        _validate_color(color_rgb)
+        if not isinstance(thickness, int):
+            raise ImageProcessorError("thickness must be an integer.")
+
+        self._paint(lambda mask: cv2.rectangle(mask, top_left, bottom_right, 255, thickness), color_rgb)
+
+    def annotate(self, text: str, position: tuple[int, int], font_scale: float = 1.0, color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2):
+        """
+        Annotate all images with text.
+
+        Args:
+            text (str): The text to annotate
+            position (tuple[int, int]): The (x, y) coordinates for the bottom-left corner of the text
+            font_scale (float): Scale factor for the text size
+            color_rgb (tuple[int, int, int]): The color of the text in RGB format
+            thickness (int): The thickness of the text
+        """
+        if not isinstance(text, str):
+            raise ImageProcessorError("text must be a string.")
+        _validate_point(position, "position")
+        if not isinstance(font_scale, (int, float)) or font_scale <= 0:
+            raise ImageProcessorError("font_scale must be a positive number.")
+        _validate_color(color_rgb)
+        if not isinstance(thickness, int):
+            raise ImageProcessorError("thickness must be an integer.")
+
+        self._paint(
+            lambda mask: cv2.putText(mask, text, position, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 255, thickness),
+            color_rgb
+        )
+
+    def convert_scale(self, alpha: float = 1.0, beta: float = 0.0):
+        """
+        Change contrast (alpha) and brightness (beta) of all images: alpha * pixel + beta,
+        clipped to 0..255.
+
+        Args:
+            alpha (float): Contrast factor
+            beta (float): Brightness offset
+        """
+        if not isinstance(alpha, (int, float)) or not isinstance(beta, (int, float)):
+            raise ImageProcessorError("alpha and beta must be numbers.")
+        # A lookup table turns the whole batch into one indexing operation
+        table = np.clip(np.arange(256) * alpha + beta, 0, 255).round().astype(np.uint8)
+        self.images = table[self.images]
+
+    def invert(self):
+        """
+        Invert all images (255 - pixel).
+        """
+        self.images = np.subtract(255, self.images, dtype=self.images.dtype)
+
+    def to_grayscale(self) -> np.ndarray:
+        """
+        Return the grey scale version of all images as an (N, H, W) array,
+        converted with cv2.cvtColor in parallel, so the pixels match OpenCV exactly.
+        """
+        if self.images.ndim == 3:
+            return self.images.copy()
+        code = cv2.COLOR_RGBA2GRAY if self.images.shape[3] == 4 else cv2.COLOR_RGB2GRAY
+        out = np.empty(self.images.shape[:3], dtype=self.images.dtype)
+        list(get_executor().map(lambda i: cv2.cvtColor(self.images[i], code, dst=out[i]), range(len(self))))
+        return out
+
+    def to_bytes(self, format: str = "jpeg", **options) -> list[memoryview]:
+        """
+        Encode all images in parallel.
+
+        Args:
+            format (str): "jpeg", "png", "webp" or another format OpenCV can write
+            **options: Encoding options, see encoding.build_params
+
+        Returns:
+            list[memoryview]: The encoded bytes of each image
+        """
+        try:
+            return encoding.encode_many(self.images, format, **options)
+        except encoding.EncodingError as e:
+            raise ImageProcessorError(str(e)) from e
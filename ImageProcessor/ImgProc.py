@@ -1,6 +1,8 @@
 
-import numpy as np
 import cv2
+import encoding
+import transforms
+from instrumentation import timed
 
 class ImageProcessorError(Exception):
     pass
@@ -9,6 +11,7 @@ class ImageProcessorError(Exception):
 
 class ImageProcessor:
 
+    @timed("imgproc.load")
     def __init__(self, image_path: str):
         """
         Initializes the ImageProcessor with an image path.
@@ -25,6 +28,7 @@ class ImageProcessor:
             raise ImageProcessorError(f"Could not load image from path: {image_path}") from e
         self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
 
+    @timed("imgproc.resize")
     def resize(self, new_width: int | None = None, new_height: int | None = None, scale: float | None = None):
         """
         Resizes the image to the specified width and height.
@@ -54,6 +58,7 @@ class ImageProcessor:
             new_height = int(self.image.shape[0] * scale)
             self.image = cv2.resize(self.image, (new_width, new_height))
 
+    @timed("imgproc.rotate")
     def rotate(
         self,
         angle: float = 0,
@@ -83,57 +88,13 @@ class ImageProcessor:
                 raise ImageProcessorError("RGB values must be integers")
             if not (0 <= c <= 255):
                 raise ImageProcessorError("RGB values must be in range 0..255")
-        # Get image dimensions
-        (h, w) = self.image.shape[:2]
-        # Calculate the center of the image
-        (cX, cY) = (w // 2, h // 2)
-
-        # Generate rotation matrix
-        # Note that OpenCV uses a clockwise angle convention, hence the negative sign
-        M = cv2.getRotationMatrix2D((cX, cY), -angle, 1.0)
-
-        # Retrieve the sine and cosine from the rotation matrix for calculating teh new dimensions
-        cos = np.abs(M[0, 0])
-        sin = np.abs(M[0, 1])
-
-        # Calculate dimensions of the box to fit the rotated image
-        # cf. https://math.stackexchange.com/questions/430763/size-of-new-box-rotated-and-the-rescaled
-        rotW = (w * cos) + (h * sin)
-        rotH = (w * sin) + (h * cos)
-
-
-        if resize_canvas:
-            # new dimensions must be integers            
-            nW = int(rotW)
-            nH = int(rotH)
-
-            # Adjust the rotation matrix to take into account translation so the image is centered
-            M[0, 2] += (nW / 2) - cX
-            M[1, 2] += (nH / 2) - cY
-
-            # Perform the actual rotation and translation and return the image
-            self.image = cv2.warpAffine(
-                self.image,
-                M,
-                (nW, nH),
-                borderValue=bg_color_rgb
-            )
-        else:
-            # Calculate the scale factor to fit the rotated image within the original dimensions
-            # Choose the smaller scaling factor to ensure the entire image fits
-            # note that when rotating the image will alwyas be doewnscaled in this mode
-            scale = min(w / rotW, h / rotH)
-
-            # Update the rotation matrix to include the scaling
-            M = cv2.getRotationMatrix2D((cX, cY), -angle, scale)
-            # Perform the actual rotation and return the image
-            self.image = cv2.warpAffine(
-                self.image,
-                M,
-                (w, h),
-                borderValue=bg_color_rgb
-            )
+        # The matrix and canvas size only depend on the image size and angle,
+        # so they are computed once per size and angle and reused for later frames
+        canvas = transforms.EXPAND if resize_canvas else transforms.FIT
+        transform = transforms.transform_cache.rotation(self.image.shape, angle, canvas=canvas)
+        self.image = transform.apply(self.image, bg_color_rgb)
 
+    @timed("imgproc.crop")
     def crop(self, x1: int, y1: int, width: int | None = None, height: int | None = None, x2: int | None = None, y2: int  | None = None):
         """
         Crop the image to the specified rectangle.
@@ -166,6 +127,7 @@ class ImageProcessor:
         
         self.image = self.image[y1:y2, x1:x2]
 
+    @timed("imgproc.draw_circle")
     def draw_circle(self, center: tuple[int, int], radius: int, color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2):
         """
         Draw a circle on the image.
@@ -192,6 +154,7 @@ class ImageProcessor:
 
         cv2.circle(self.image, center, radius, color_rgb, thickness)
 
+    @timed("imgproc.draw_rectangle")
     def draw_rectangle(self, top_left: tuple[int, int], bottom_right: tuple[int, int], color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2):
         """
         Draw a rectangle on the image.
@@ -218,6 +181,7 @@ class ImageProcessor:
 
         cv2.rectangle(self.image, top_left, bottom_right, color_rgb, thickness)
 
+    @timed("imgproc.annotate")
     def annotate(self, text: str, position: tuple[int, int], font_scale: float = 1.0, color_rgb: tuple[int, int, int] = (255, 255, 255), thickness: int = 2):
         """
         Annotate the image with text.
@@ -245,4 +209,37 @@ class ImageProcessor:
         if not isinstance(thickness, int):
             raise ImageProcessorError("thickness must be an integer.")
 
-        cv2.putText(self.image, text, position, cv2.FONT_HERSHEY_SIMPLEX, font_scale, color_rgb, thickness)
\ No newline at end of file
+        cv2.putText(self.image, text, position, cv2.FONT_HERSHEY_SIMPLEX, font_scale, color_rgb, thickness)
+
+    @timed("imgproc.save")
+    def save(self, image_path: str, **options):
+        """
+        Save the image to a file. The format is chosen by the file extension.
+        Converts back to BGR before writing, as OpenCV expects.
+
+        Args:
+            image_path (str): Path of the file to write
+            **options: Encoding options, e.g. quality=80 or progressive=True for JPEG,
+                compression=9 for PNG, see encoding.build_params
+        """
+        try:
+            encoding.write(image_path, self.image, **options)
+        except encoding.EncodingError as e:
+            raise ImageProcessorError(str(e)) from e
+
+    @timed("imgproc.to_bytes")
+    def to_bytes(self, format: str = "jpeg", **options) -> memoryview:
+        """
+        Encode the image in memory, e.g. to serve it over HTTP.
+
+        Args:
+            format (str): "jpeg", "png", "webp" or another format OpenCV can write
+            **options: Encoding options, see encoding.build_params
+
+        Returns:
+            memoryview: The encoded bytes, without a copy of OpenCV's buffer
+        """
+        try:
+            return encoding.encode(self.image, format, **options)
+        except encoding.EncodingError as e:
+            raise ImageProcessorError(str(e)) from e
@@ -0,0 +1,367 @@
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from ImgProc import ImageProcessor
+from detection import PATCH_SIZE, compute_hog_features, extract_windows, non_max_suppression
+
+# The sample images and the video scripts live one directory up
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_IMAGES = ("fruits.jpg", "building.jpg", "PCB.jpg", "NASA_Astronaut_Group_18.jpg")
+FACE_IMAGE = "NASA_Astronaut_Group_18.jpg"
+# Slow cases stop after their time budget, but never with fewer samples than this
+MIN_SAMPLES = 3
+# Peak memory increases below this are not reported as regressions
+MEMORY_NOISE_MB = 1.0
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def time_function(fn, repeat: int = 20, warmup: int = 2, items: int = 1, max_seconds: float | None = None, setup=None) -> dict:
+    """
+    Time a function and measure its peak memory.
+
+    Timing and memory are measured in separate runs, because tracemalloc slows
+    down every allocation and would distort the timings.
+
+    Args:
+        fn (callable): Function without arguments, called once per sample
+        repeat (int): Number of timed calls
+        warmup (int): Number of untimed calls before timing (caches, lazy initialisation)
+        items (int): Items processed per call (frames, windows, ...), used for the throughput
+        max_seconds (float, optional): Stop timing early once this much time was spent,
+            but only after at least MIN_SAMPLES calls
+        setup (callable, optional): Called before every call of fn, outside the timed
+            region and outside the memory measurement, e.g. to restore the input
+
+    Returns:
+        dict: Timings in milliseconds, throughput in items per second and peak memory in MB
+    """
+    if setup is None:
+        setup = lambda: None
+    for i in range(warmup):
+        setup()
+        fn()
+    samples = []
+    for i in range(repeat):
+        setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+        if max_seconds is not None and len(samples) >= MIN_SAMPLES and sum(samples) > max_seconds:
+            break
+    samples = np.array(samples)
+
+    setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    (p50, p90, p99) = np.percentile(samples, (50, 90, 99))
+    return {
+        "repeat": len(samples),
+        "mean_ms": float(samples.mean() * 1000),
+        "p50_ms": float(p50 * 1000),
+        "p90_ms": float(p90 * 1000),
+        "p99_ms": float(p99 * 1000),
+        "throughput_per_s": float(items / p50) if p50 > 0 else float("inf"),
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def _fresh_processor(image_path: str) -> ImageProcessor:
+    processor = ImageProcessor(image_path)
+    # Keep a pristine copy so every timed call starts from the same image
+    processor.original = processor.image.copy()
+    return processor
+
+
+def _reset(processor: ImageProcessor) -> ImageProcessor:
+    processor.image = processor.original.copy()
+    return processor
+
+
+def image_processor_cases():
+    """
+    One case per ImageProcessor operation and sample image.
+    The image is restored before every call, outside the timed region.
+    """
+    for name in SAMPLE_IMAGES:
+        path = os.path.join(REPO_ROOT, name)
+        yield f"imgproc.load[{name}]", lambda path=path: ImageProcessor(path), 1
+        processor = _fresh_processor(path)
+        (h, w) = processor.image.shape[:2]
+        operations = {
+            "resize_half": lambda p: p.resize(scale=0.5),
+            "resize_640": lambda p: p.resize(640, 480),
+            "rotate_canvas": lambda p: p.rotate(angle=30),
+            "rotate_fit": lambda p: p.rotate(angle=30, resize_canvas=False),
+            "crop": lambda p, w=w, h=h: p.crop(x1=w // 4, y1=h // 4, width=w // 2, height=h // 2),
+            "draw_circle": lambda p, w=w, h=h: p.draw_circle((w // 2, h // 2), min(w, h) // 4),
+            "draw_rectangle": lambda p, w=w, h=h: p.draw_rectangle((10, 10), (w // 2, h // 2)),
+            "annotate": lambda p: p.annotate("Benchmark", (50, 50)),
+        }
+        for op_name, op in operations.items():
+            yield f"imgproc.{op_name}[{name}]", lambda p=processor, op=op: op(p), 1, lambda p=processor: _reset(p)
+
+
+def _video_module():
+    # show_video.py is a script in the repository root
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    import show_video
+    return show_video
+
+
+def video_cases(resolutions=(320, 640, 1018)):
+    """
+    find_faces at several resolutions, identify_valid_faces at several face counts
+    and the full read -> detect -> track loop on a synthetic video.
+    """
+    show_video = _video_module()
+    frame = cv2.imread(os.path.join(REPO_ROOT, FACE_IMAGE))
+    width = frame.shape[1]
+    for resolution in resolutions:
+        scale = min(1, resolution / width)
+        yield f"video.find_faces[{resolution}px]", lambda scale=scale: show_video.find_faces(frame, scale), 1
+
+    rng = np.random.default_rng(0)
+    for count in (1, 10, 50, 200):
+        positions = rng.integers(0, 900, size=(count, 2))
+        sizes = rng.integers(30, 120, size=(count, 1))
+        tracked = [((int(x), int(y), int(s), int(s)), 3) for (x, y), (s,) in zip(positions, sizes)]
+        # New faces moved a little since the last frame
+        new_faces = [(x + 2, y + 1, w, h) for ((x, y, w, h), count_) in tracked]
+        yield (
+            f"video.identify_valid_faces[{count}faces]",
+            lambda tracked=tracked, new_faces=new_faces: show_video.identify_valid_faces(tracked, new_faces),
+            count,
+        )
+
+    n_frames = 10
+    video_path = write_synthetic_video(frame, n_frames)
+
+    def run_loop():
+        cap = cv2.VideoCapture(video_path)
+        face_tracker = []
+        scale = min(1, 640 / width)
+        while True:
+            ret, current = cap.read()
+            if not ret:
+                break
+            faces = show_video.find_faces(current, scale)
+            face_tracker = show_video.identify_valid_faces(face_tracker, faces)
+            faces = [face for (face, count) in face_tracker if count > 2]
+            show_video.draw_faces(current, faces)
+        cap.release()
+
+    yield "video.synthetic_loop[640px]", run_loop, n_frames
+
+
+def write_synthetic_video(frame: np.ndarray, n_frames: int = 10) -> str:
+    """
+    Write a short video in which the sample image slowly pans to the right.
+    The file is reused between runs, so every run decodes the same frames.
+    Its name contains the size and a hash of the source frame, so a changed
+    source never reuses an old video.
+
+    Args:
+        frame (np.ndarray): BGR image used for all frames
+        n_frames (int): Number of frames
+    """
+    (h, w) = frame.shape[:2]
+    digest = hashlib.sha1(np.ascontiguousarray(frame)).hexdigest()[:12]
+    path = os.path.join(tempfile.gettempdir(), f"cv_benchmark_{digest}_{w}x{h}_{n_frames}.avi")
+    if os.path.exists(path):
+        return path
+    # Written under a temporary name and renamed when complete, so a killed run
+    # never leaves a partial video that later runs would take as their input
+    temporary_path = f"{path[:-4]}.{os.getpid()}.tmp.avi"
+    writer = cv2.VideoWriter(temporary_path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (w, h))
+    if not writer.isOpened():
+        raise BenchmarkError("Could not open a video writer for the synthetic video.")
+    try:
+        for i in range(n_frames):
+            writer.write(np.roll(frame, 2 * i, axis=1))
+    finally:
+        writer.release()
+    os.replace(temporary_path, path)
+    return path
+
+
+def hog_cases():
+    """
+    Sliding window HOG with a linear scoring step, and NMS on many overlapping boxes.
+    """
+    grey = cv2.imread(os.path.join(REPO_ROOT, FACE_IMAGE), cv2.IMREAD_GRAYSCALE)
+    # Half resolution keeps a single run in the range of seconds
+    grey = cv2.resize(grey, (0, 0), fx=0.5, fy=0.5)
+    positions, windows = extract_windows(grey, PATCH_SIZE, 10, 10)
+    n_features = compute_hog_features(windows[:1]).shape[1]
+    weights = np.random.default_rng(0).standard_normal(n_features)
+
+    def sliding_window_hog():
+        features = compute_hog_features(windows)
+        return features @ weights
+
+    yield "hog.sliding_window[half_res]", sliding_window_hog, len(windows)
+
+    rng = np.random.default_rng(1)
+    for count in (100, 1000, 5000):
+        xy = rng.integers(0, 1000, size=(count, 2))
+        boxes = np.hstack((xy, np.full((count, 2), PATCH_SIZE)))
+        scores = rng.random(count)
+        yield f"hog.nms[{count}boxes]", lambda boxes=boxes, scores=scores: non_max_suppression(boxes, scores, 0.3), count
+
+
+SUITES = {
+    "imgproc": image_processor_cases,
+    "video": video_cases,
+    "hog": hog_cases,
+}
+
+
+def run_suite(suites=tuple(SUITES), name_filter: str | None = None, repeat: int = 20, warmup: int = 2, max_seconds: float | None = 10.0) -> dict:
+    """
+    Run the benchmark cases and return the results by case name.
+
+    Args:
+        suites (tuple[str, ...]): Names of the suites to run (see SUITES)
+        name_filter (str, optional): Only run cases whose name contains this text
+        repeat (int): Number of timed calls per case
+        warmup (int): Number of untimed calls per case
+        max_seconds (float, optional): Time budget per case, see time_function
+    """
+    results = {}
+    for suite in suites:
+        if suite not in SUITES:
+            raise BenchmarkError(f"Unknown suite: {suite}")
+        # Cases are (name, fn, items) or (name, fn, items, setup)
+        for (name, fn, items, *setup) in SUITES[suite]():
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = time_function(
+                fn, repeat=repeat, warmup=warmup, items=items, max_seconds=max_seconds, setup=setup[0] if setup else None
+            )
+            print(format_result(name, results[name]), flush=True)
+    return results
+
+
+def format_result(name: str, result: dict) -> str:
+    return (
+        f"{name:<48} p50 {result['p50_ms']:9.2f} ms  p90 {result['p90_ms']:9.2f} ms  "
+        f"p99 {result['p99_ms']:9.2f} ms  {result['throughput_per_s']:12.1f}/s  "
+        f"peak {result['peak_memory_mb']:8.2f} MB"
+    )
+
+
+def save_baseline(results: dict, path: str):
+    """
+    Save results as a JSON baseline, together with a description of the machine.
+    """
+    data = {
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)["results"]
+    except (OSError, ValueError, KeyError) as e:
+        raise BenchmarkError(f"Could not load baseline from path: {path}") from e
+
+
+def compare_results(
+    results: dict,
+    baseline: dict,
+    threshold: float = 0.2,
+    metric: str = "p50_ms",
+    memory_threshold: float = 0.2
+) -> list[str]:
+    """
+    Compare results against a baseline.
+
+    Args:
+        results (dict): Output of run_suite
+        baseline (dict): Results of an earlier run
+        threshold (float): Allowed relative slowdown, 0.2 = 20 percent.
+            The throughput is derived from the p50 time, so it is covered by this check.
+        metric (str): Timing used for the comparison
+        memory_threshold (float): Allowed relative growth of the peak memory.
+            Growth below MEMORY_NOISE_MB is ignored, small peaks vary between runs.
+
+    Returns:
+        list[str]: One message per case and metric that regressed beyond its threshold
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name][metric]
+        after = result[metric]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append(f"{name}: {metric} {before:.2f} -> {after:.2f} (+{(after / before - 1) * 100:.0f}%)")
+        if "peak_memory_mb" in baseline[name] and "peak_memory_mb" in result:
+            before = baseline[name]["peak_memory_mb"]
+            after = result["peak_memory_mb"]
+            if after > before * (1 + memory_threshold) and after - before > MEMORY_NOISE_MB:
+                increase = f"+{(after / before - 1) * 100:.0f}%" if before > 0 else "new"
+                regressions.append(f"{name}: peak_memory_mb {before:.2f} -> {after:.2f} ({increase})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the image processing and face detection code.")
+    parser.add_argument("--suite", action="append", choices=tuple(SUITES), help="Suite to run, default is all")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per case")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls per case")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Time budget per case")
+    parser.add_argument("--save", help="Write the results as JSON baseline to this path")
+    parser.add_argument("--compare", help="Compare against the JSON baseline at this path")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before failing, 0.2 = 20%%")
+    parser.add_argument("--memory-threshold", type=float, default=0.2, help="Allowed peak memory growth before failing, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    results = run_suite(tuple(args.suite or SUITES), args.filter, args.repeat, args.warmup, args.max_seconds)
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        regressions = compare_results(results, load_baseline(args.compare), args.threshold, memory_threshold=args.memory_threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+    return 0
+
+
+# Access point for running the benchmarks, e.g.
+# python benchmark.py --save baseline.json
+# python benchmark.py --compare baseline.json --threshold 0.25
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+
+import os
+import threading
+
+import cv2
+
+
+class ClassifierError(Exception):
+    pass
+
+
+DEFAULT_CASCADE = "haarcascade_frontalface_default.xml"
+
+# Relative cascade names are looked up in these directories, in this order:
+# the repository root (where the face cascade is checked in) and the cascades shipped with OpenCV.
+CASCADE_DIRS = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+if hasattr(cv2, "data"):
+    CASCADE_DIRS.append(cv2.data.haarcascades)
+
+# cv2.CascadeClassifier must not be used by two threads at the same time,
+# so every thread gets its own instances. A thread that forks a worker process
+# passes its instances on to the worker, which is what prewarm relies on.
+_local = threading.local()
+
+
+def resolve_cascade_path(name: str) -> str:
+    """
+    Find the file of a cascade.
+
+    Args:
+        name (str): File name (looked up in CASCADE_DIRS) or path of the cascade XML file
+    """
+    if not isinstance(name, str) or not name:
+        raise ClassifierError("name must be a non-empty string.")
+    if os.path.isabs(name) or os.path.exists(name):
+        return os.path.abspath(name)
+    for directory in CASCADE_DIRS:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    raise ClassifierError(f"Could not find cascade: {name}")
+
+
+def get_cascade(name: str = DEFAULT_CASCADE) -> cv2.CascadeClassifier:
+    """
+    Return the cascade classifier of the calling thread, loading it on first use.
+
+    Args:
+        name (str): File name or path of the cascade XML file
+    """
+    instances = getattr(_local, "instances", None)
+    if instances is None:
+        instances = _local.instances = {}
+    classifier = instances.get(name)
+    if classifier is None:
+        path = resolve_cascade_path(name)
+        classifier = cv2.CascadeClassifier(path)
+        if classifier.empty():
+            raise ClassifierError(f"Could not load cascade from path: {path}")
+        instances[name] = classifier
+    return classifier
+
+
+def prewarm(names: tuple[str, ...] = (DEFAULT_CASCADE,)):
+    """
+    Load cascades in the calling thread before a worker pool is started.
+
+    With the "fork" start method every worker starts with a copy of the parent,
+    so the workers don't have to parse the XML files again.
+
+    Args:
+        names (tuple[str, ...]): Cascades to load
+    """
+    for name in names:
+        get_cascade(name)
+
+
+def loaded_cascades() -> tuple[str, ...]:
+    """
+    Return the names of the cascades loaded by the calling thread.
+    """
+    return tuple(getattr(_local, "instances", {}))
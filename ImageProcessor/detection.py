@@ -0,0 +1,162 @@
+
+import numpy as np
+
+
+class DetectionError(Exception):
+    pass
+
+
+# Size of the face patches (width, height) used to train the HOG detectors
+PATCH_SIZE = (47, 62)
+
+
+def sliding_window(image: np.ndarray, window_size: tuple[int, int] = PATCH_SIZE, x_step: int = 10, y_step: int = 10):
+    """
+    Yield ((x, y), window) for every window position, like in the HOG exercise.
+
+    Args:
+        image (np.ndarray): Grey scale image
+        window_size (tuple[int, int]): (width, height) of the window
+        x_step (int): Horizontal step in pixels
+        y_step (int): Vertical step in pixels
+    """
+    for y in range(0, image.shape[0] - window_size[1], y_step):
+        for x in range(0, image.shape[1] - window_size[0], x_step):
+            yield ((x, y), image[y:y + window_size[1], x:x + window_size[0]])
+
+
+def _window_grid(image: np.ndarray, window_size: tuple[int, int], x_step: int, y_step: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the x and y positions and a (ny, nx, height, width) view of all windows, without copying.
+    """
+    if not isinstance(image, np.ndarray) or image.ndim != 2:
+        raise DetectionError("image must be a 2D numpy array.")
+    (w, h) = window_size
+    if image.shape[0] <= h or image.shape[1] <= w:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 0, h, w), dtype=image.dtype)
+    # The last row and column are excluded, to match the ranges of sliding_window
+    views = np.lib.stride_tricks.sliding_window_view(image[:-1, :-1], (h, w))[::y_step, ::x_step]
+    xs = np.arange(views.shape[1]) * x_step
+    ys = np.arange(views.shape[0]) * y_step
+    return xs, ys, views
+
+
+def _positions(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    (grid_x, grid_y) = np.meshgrid(xs, ys)
+    return np.stack((grid_x.ravel(), grid_y.ravel()), axis=1)
+
+
+def extract_windows(image: np.ndarray, window_size: tuple[int, int] = PATCH_SIZE, x_step: int = 10, y_step: int = 10) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Same windows as sliding_window, but as one array.
+
+    The windows overlap, so the array is a copy that can be many times larger than
+    the image (7 MB of windows for a 500x600 image). Use window_batches to process
+    large images batch by batch.
+
+    Args:
+        image (np.ndarray): Grey scale image
+        window_size (tuple[int, int]): (width, height) of the window
+        x_step (int): Horizontal step in pixels
+        y_step (int): Vertical step in pixels
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (N, 2) array of (x, y) positions and
+            (N, height, width) array of windows
+    """
+    (xs, ys, views) = _window_grid(image, window_size, x_step, y_step)
+    (w, h) = window_size
+    return _positions(xs, ys), views.reshape(-1, h, w)
+
+
+def window_batches(image: np.ndarray, window_size: tuple[int, int] = PATCH_SIZE, x_step: int = 10, y_step: int = 10, batch_size: int = 4096):
+    """
+    Yield (positions, windows) in batches of whole window rows, about batch_size windows each.
+    Only one batch of windows is copied out of the image at a time.
+
+    Args:
+        image (np.ndarray): Grey scale image
+        window_size (tuple[int, int]): (width, height) of the window
+        x_step (int): Horizontal step in pixels
+        y_step (int): Vertical step in pixels
+        batch_size (int): Windows per batch, at least one row of windows
+    """
+    if not isinstance(batch_size, int) or batch_size <= 0:
+        raise DetectionError("batch_size must be a positive integer.")
+    (xs, ys, views) = _window_grid(image, window_size, x_step, y_step)
+    (w, h) = window_size
+    rows = max(1, batch_size // max(1, len(xs)))
+    for start in range(0, len(ys), rows):
+        yield _positions(xs, ys[start:start + rows]), views[start:start + rows].reshape(-1, h, w)
+
+
+def compute_hog_features(images, pixels_per_cell: tuple[int, int] = (8, 8), cells_per_block: tuple[int, int] = (2, 2)) -> np.ndarray:
+    """
+    Compute the HOG feature vector of every image.
+
+    Args:
+        images: Iterable of equally sized grey scale images
+        pixels_per_cell (tuple[int, int]): HOG cell size
+        cells_per_block (tuple[int, int]): HOG block size in cells
+
+    Returns:
+        np.ndarray: (N, F) array of feature vectors
+    """
+    # skimage is slow to import, so only load it when features are computed
+    from skimage import feature
+    return np.array([
+        feature.hog(img, pixels_per_cell=pixels_per_cell, cells_per_block=cells_per_block)
+        for img in images
+    ])
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Intersection over union of every box in boxes_a with every box in boxes_b.
+
+    Args:
+        boxes_a (np.ndarray): (N, 4) array of (x, y, w, h)
+        boxes_b (np.ndarray): (M, 4) array of (x, y, w, h)
+
+    Returns:
+        np.ndarray: (N, M) array of IoU values
+    """
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    # Broadcasting (N, 1) against (1, M) gives all pairs at once
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 0] + a[:, None, 2], b[None, :, 0] + b[None, :, 2])
+    y2 = np.minimum(a[:, None, 1] + a[:, None, 3], b[None, :, 1] + b[None, :, 3])
+    intersection = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - intersection
+    # IoU is 0 for degenerate boxes without area
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.3) -> np.ndarray:
+    """
+    Remove duplicate detections. Boxes are visited from the highest score down,
+    and every box overlapping an already kept box by more than iou_threshold is dropped.
+
+    Args:
+        boxes (np.ndarray): (N, 4) array of (x, y, w, h)
+        scores (np.ndarray): (N,) array of confidence scores
+        iou_threshold (float): Overlap above which a box counts as a duplicate
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, highest score first
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    if boxes.shape[0] != scores.shape[0]:
+        raise DetectionError("boxes and scores must have the same length.")
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size > 0:
+        best = order[0]
+        keep.append(best)
+        # Compare the best remaining box with all others in one go
+        overlaps = iou_matrix(boxes[best], boxes[order[1:]])[0]
+        order = order[1:][overlaps <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
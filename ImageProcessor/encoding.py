@@ -0,0 +1,170 @@
+
+import os
+
+import numpy as np
+import cv2
+from pools import get_executor
+
+
+class EncodingError(Exception):
+    pass
+
+
+# File extensions of the formats with options, by format name
+FORMATS = {
+    "jpeg": ".jpg",
+    "png": ".png",
+    "webp": ".webp",
+}
+# Other names and extensions that refer to the same formats
+_ALIASES = {"jpg": "jpeg", "jpe": "jpeg"}
+
+
+def normalise_format(format: str) -> str:
+    """
+    Return the format name for a format or file extension, e.g. ".JPG" -> "jpeg".
+    Formats without options (bmp, tiff, ...) are returned as they are.
+    """
+    if not isinstance(format, str) or not format.strip("."):
+        raise EncodingError("format must be a non-empty string.")
+    name = format.lower().lstrip(".")
+    return _ALIASES.get(name, name)
+
+
+def format_from_path(image_path: str) -> str:
+    """
+    Return the format name for the extension of a file path.
+    """
+    extension = os.path.splitext(image_path)[1]
+    if not extension:
+        raise EncodingError(f"Could not determine the format of path: {image_path}")
+    return normalise_format(extension)
+
+
+def build_params(
+    format: str,
+    quality: int | None = None,
+    progressive: bool = False,
+    optimize: bool = False,
+    compression: int | None = None,
+    lossless: bool = False
+) -> list[int]:
+    """
+    Translate encoding options into the parameter list of cv2.imencode / cv2.imwrite.
+
+    Args:
+        format (str): "jpeg", "png" or "webp" (or another format OpenCV can write, without options)
+        quality (int, optional): JPEG quality 0..100 or WebP quality 1..100.
+            Lower is smaller and faster, OpenCV's default is 95 for JPEG.
+        progressive (bool): JPEG only, write a progressive JPEG
+        optimize (bool): JPEG only, optimise the Huffman tables (smaller, a bit slower)
+        compression (int, optional): PNG only, zlib level 0..9.
+            0 is fastest and largest, 9 smallest and slowest, OpenCV's default is 1.
+        lossless (bool): WebP only, lossless compression, can't be combined with quality
+    """
+    format = normalise_format(format)
+    params = []
+    if quality is not None:
+        if format == "jpeg":
+            if not isinstance(quality, int) or not (0 <= quality <= 100):
+                raise EncodingError("quality must be an integer in range 0..100.")
+            params += [cv2.IMWRITE_JPEG_QUALITY, quality]
+        elif format == "webp":
+            if not isinstance(quality, int) or not (1 <= quality <= 100):
+                raise EncodingError("quality must be an integer in range 1..100.")
+            params += [cv2.IMWRITE_WEBP_QUALITY, quality]
+        else:
+            raise EncodingError(f"quality is not supported for format: {format}")
+    if progressive or optimize:
+        if format != "jpeg":
+            raise EncodingError(f"progressive and optimize are only supported for jpeg, not: {format}")
+        if progressive:
+            params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+        if optimize:
+            params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    if compression is not None:
+        if format != "png":
+            raise EncodingError(f"compression is only supported for png, not: {format}")
+        if not isinstance(compression, int) or not (0 <= compression <= 9):
+            raise EncodingError("compression must be an integer in range 0..9.")
+        params += [cv2.IMWRITE_PNG_COMPRESSION, compression]
+    if lossless:
+        if format != "webp":
+            raise EncodingError(f"lossless is only supported for webp, not: {format}")
+        if quality is not None:
+            raise EncodingError("quality can't be combined with lossless.")
+        # OpenCV switches WebP to lossless for quality values above 100
+        params += [cv2.IMWRITE_WEBP_QUALITY, 101]
+    return params
+
+
+def _to_bgr(image_rgb: np.ndarray) -> np.ndarray:
+    if not isinstance(image_rgb, np.ndarray) or image_rgb.ndim not in (2, 3):
+        raise EncodingError("image must be a 2D or 3D numpy array.")
+    if image_rgb.ndim == 3 and image_rgb.shape[2] == 3:
+        return cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    if image_rgb.ndim == 3 and image_rgb.shape[2] == 4:
+        return cv2.cvtColor(image_rgb, cv2.COLOR_RGBA2BGRA)
+    return image_rgb
+
+
+def encode(image_rgb: np.ndarray, format: str = "jpeg", **options) -> memoryview:
+    """
+    Encode an RGB (or grey scale) image in memory.
+
+    The result is a memoryview of the buffer filled by OpenCV, so it can be
+    written to a socket or an HTTP response without another copy.
+
+    Args:
+        image_rgb (np.ndarray): The image
+        format (str): "jpeg", "png", "webp" or another format OpenCV can write
+        **options: Encoding options, see build_params
+
+    Returns:
+        memoryview: The encoded bytes
+    """
+    format = normalise_format(format)
+    params = build_params(format, **options)
+    extension = FORMATS.get(format, "." + format)
+    try:
+        success, buffer = cv2.imencode(extension, _to_bgr(image_rgb), params)
+    except cv2.error as e:
+        raise EncodingError(f"Could not encode image as {format}") from e
+    if not success:
+        raise EncodingError(f"Could not encode image as {format}")
+    return buffer.reshape(-1).data
+
+
+def encode_many(images, format: str = "jpeg", **options) -> list[memoryview]:
+    """
+    Encode many images in parallel on a shared thread pool.
+
+    Args:
+        images: Iterable of RGB images, e.g. a list or an (N, H, W, C) array
+        format (str): "jpeg", "png", "webp" or another format OpenCV can write
+        **options: Encoding options, see build_params
+
+    Returns:
+        list[memoryview]: The encoded bytes, in the order of the images
+    """
+    # Check the options once, before any work is handed out
+    build_params(format, **options)
+    return list(get_executor().map(lambda image: encode(image, format, **options), images))
+
+
+def write(image_path: str, image_rgb: np.ndarray, **options):
+    """
+    Save an RGB (or grey scale) image. The format is chosen by the file extension.
+
+    Args:
+        image_path (str): Path of the file to write
+        image_rgb (np.ndarray): The image
+        **options: Encoding options, see build_params
+    """
+    params = build_params(format_from_path(image_path), **options)
+    try:
+        written = cv2.imwrite(image_path, _to_bgr(image_rgb), params)
+    except cv2.error as e:
+        raise EncodingError(f"Could not save image to path: {image_path}") from e
+    if not written:
+        raise EncodingError(f"Could not save image to path: {image_path}")
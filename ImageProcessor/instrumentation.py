@@ -0,0 +1,399 @@
+
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class InstrumentationError(Exception):
+    pass
+
+
+# Upper bounds of the histogram buckets in seconds, from half a millisecond to a few seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """
+    Counts observations per bucket, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One extra bucket for everything above the last bound (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "max": self.max,
+                "counts": list(self.counts),
+            }
+
+
+class _StageTimer:
+    """
+    Context manager that adds the elapsed time of its block to a histogram.
+    """
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe((time.perf_counter_ns() - self.start) / 1e9)
+        return False
+
+
+class _NoOpTimer:
+    """
+    Shared do-nothing context manager, returned while the metrics are disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_OP_TIMER = _NoOpTimer()
+
+
+class SamplingProfiler:
+    """
+    Low overhead profiler: a background thread looks at the call stacks of all
+    other threads every `interval` seconds and counts how often each stack is seen.
+    Stacks are stored in the folded format (outermost;...;innermost) used by flame graphs.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 32):
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise InstrumentationError("interval must be a positive number.")
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                with self._lock:
+                    self.stacks[";".join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        """
+        Return the collected stacks in folded format, one "stack count" per line.
+        """
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def top(self, n: int = 10) -> list[tuple[str, int]]:
+        """
+        Return the n innermost functions with the most samples.
+        """
+        leaves = Counter()
+        with self._lock:
+            for stack, count in self.stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+class Metrics:
+    """
+    Registry of stage timings, counters and gauges.
+
+    While disabled, stage() returns a shared no-op context manager and the
+    counter functions return immediately, so the instrumented code pays
+    only for a method call and one attribute check.
+    """
+
+    def __init__(self, enabled: bool = False, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._http_server = None
+        self._json_logger = None
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def stage(self, name: str):
+        """
+        Time a block of code, e.g.
+
+            with metrics.stage("video.read"):
+                ret, frame = cap.read()
+
+        Args:
+            name (str): Name of the stage
+        """
+        if not self.enabled:
+            return _NO_OP_TIMER
+        return _StageTimer(self.histogram(name))
+
+    def observe(self, name: str, seconds: float):
+        """
+        Add a duration measured elsewhere to the histogram of a stage.
+        """
+        if not self.enabled:
+            return
+        self.histogram(name).observe(seconds)
+
+    def increment(self, name: str, amount: int = 1):
+        """
+        Increase a counter, e.g. for dropped frames.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        """
+        Set a value that can go up and down, e.g. a queue length.
+        """
+        if not self.enabled:
+            return
+        self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        """
+        Return all current values as a JSON serialisable dict.
+        """
+        with self._lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        stages = {}
+        for name, histogram in histograms.items():
+            data = histogram.snapshot()
+            stages[name] = {
+                "count": data["count"],
+                "total_ms": data["sum"] * 1000,
+                "mean_ms": data["sum"] / data["count"] * 1000 if data["count"] else 0.0,
+                "max_ms": data["max"] * 1000,
+            }
+        return {"time": time.time(), "stages": stages, "counters": counters, "gauges": gauges}
+
+    def to_prometheus(self) -> str:
+        """
+        Return all metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP cv_stage_seconds Time spent per processing stage.",
+            "# TYPE cv_stage_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+        for name, histogram in histograms:
+            data = histogram.snapshot()
+            label = _escape_label(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets, data["counts"]):
+                cumulative += count
+                lines.append(f'cv_stage_seconds_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'cv_stage_seconds_bucket{{stage="{label}",le="+Inf"}} {data["count"]}')
+            lines.append(f'cv_stage_seconds_sum{{stage="{label}"}} {data["sum"]}')
+            lines.append(f'cv_stage_seconds_count{{stage="{label}"}} {data["count"]}')
+        lines.append("# HELP cv_events_total Number of events, e.g. dropped frames.")
+        lines.append("# TYPE cv_events_total counter")
+        for name, value in counters:
+            lines.append(f'cv_events_total{{event="{_escape_label(name)}"}} {value}')
+        lines.append("# HELP cv_gauge Current values, e.g. queue lengths.")
+        lines.append("# TYPE cv_gauge gauge")
+        for name, value in gauges:
+            lines.append(f'cv_gauge{{name="{_escape_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: int = 9100, host: str = "127.0.0.1") -> int:
+        """
+        Serve /metrics (Prometheus text) and /profile (folded stacks) in a background thread.
+
+        Args:
+            port (int): Port to listen on, 0 picks a free port
+            host (str): Interface to listen on, local only by default
+
+        Returns:
+            int: The port the server listens on
+        """
+        if self._http_server is not None:
+            return self._http_server.server_address[1]
+        # Imported here, most processes never serve metrics
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.to_prometheus()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/profile" and registry.profiler is not None:
+                    body = registry.profiler.folded()
+                    content_type = "text/plain"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would flood the console otherwise
+                pass
+
+        self._http_server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._http_server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._http_server.server_address[1]
+
+    def stop_http_server(self):
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+    def start_json_logger(self, interval: float = 10.0, write=None):
+        """
+        Write one JSON line with the current snapshot every `interval` seconds.
+
+        Args:
+            interval (float): Seconds between two lines
+            write (callable, optional): Function receiving each line, default prints to stderr
+        """
+        if self._json_logger is not None:
+            return
+        if write is None:
+            write = lambda line: print(line, file=sys.stderr, flush=True)
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                write(json.dumps(self.snapshot(), sort_keys=True))
+
+        thread = threading.Thread(target=run, name="metrics-json", daemon=True)
+        self._json_logger = (stop, thread)
+        thread.start()
+
+    def stop_json_logger(self):
+        if self._json_logger is not None:
+            (stop, thread) = self._json_logger
+            stop.set()
+            thread.join()
+            self._json_logger = None
+
+    def enable_profiler(self, interval: float = 0.005) -> SamplingProfiler:
+        """
+        Start the sampling profiler. Can be called at any time while the program runs.
+        """
+        if self.profiler is None or not self.profiler.running:
+            self.profiler = SamplingProfiler(interval)
+            self.profiler.start()
+        return self.profiler
+
+    def disable_profiler(self):
+        """
+        Stop the sampling profiler. The collected stacks stay available in self.profiler.
+        """
+        if self.profiler is not None:
+            self.profiler.stop()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Shared registry for the whole process.
+# Set CV_METRICS=1 to enable it from the start, or call metrics.enable() at runtime.
+metrics = Metrics(enabled=os.environ.get("CV_METRICS", "") not in ("", "0"))
+
+
+def timed(name: str):
+    """
+    Decorator that times every call of a function as stage `name` in the shared registry.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            with _StageTimer(metrics.histogram(name)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
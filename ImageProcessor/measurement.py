@@ -0,0 +1,229 @@
+
+import csv
+import os
+import glob
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2
+
+
+class MeasurementError(Exception):
+    pass
+
+
+# Columns of the results table written by measure_directory
+RESULT_COLUMNS = ("image", "object_id", "x1", "y1", "x2", "y2", "area", "centroid_x", "centroid_y")
+# Columns of the per-image status table, so images without objects can be told apart
+# from images that could not be processed
+STATUS_COLUMNS = ("image", "objects", "error")
+
+
+def segment_objects(
+    image: np.ndarray,
+    blur_ksize: int = 15,
+    blur_sigma: float = 2.5,
+    close_ksize: int = 5,
+    invert: bool = True
+) -> np.ndarray:
+    """
+    Turn an image into a binary mask of objects (blur -> Otsu threshold -> closing).
+    These are the steps of the screw detection exercise.
+
+    Args:
+        image (np.ndarray): BGR or grey scale image
+        blur_ksize (int): Size of the Gaussian kernel, 0 to skip blurring
+        blur_sigma (float): Sigma of the Gaussian kernel
+        close_ksize (int): Size of the closing kernel, 0 to skip closing
+        invert (bool): True if the objects are darker than the background
+    """
+    if not isinstance(image, np.ndarray) or image.ndim not in (2, 3):
+        raise MeasurementError("image must be a 2D or 3D numpy array.")
+    if not isinstance(blur_ksize, int) or blur_ksize < 0 or (blur_ksize > 0 and blur_ksize % 2 == 0):
+        raise MeasurementError("blur_ksize must be 0 or a positive odd integer.")
+    if not isinstance(close_ksize, int) or close_ksize < 0:
+        raise MeasurementError("close_ksize must be a non-negative integer.")
+
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    if blur_ksize > 0:
+        grey = cv2.GaussianBlur(grey, (blur_ksize, blur_ksize), sigmaX=blur_sigma, sigmaY=blur_sigma)
+    threshold_type = cv2.THRESH_BINARY_INV if invert else cv2.THRESH_BINARY
+    _, mask = cv2.threshold(grey, 0, 255, threshold_type + cv2.THRESH_OTSU)
+    if close_ksize > 0:
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((close_ksize, close_ksize), np.uint8))
+    return mask
+
+
+def measure_mask(mask: np.ndarray, connectivity: int = 8) -> dict[str, np.ndarray]:
+    """
+    Measure all blobs of a binary mask in one call to cv2.connectedComponentsWithStats.
+
+    Instead of looping over contours in Python, boxes, areas and centroids
+    of all objects come back as arrays (one row per object, background removed).
+
+    Args:
+        mask (np.ndarray): 2D binary mask (objects are non-zero)
+        connectivity (int): 4 or 8 neighbourhood
+
+    Returns:
+        dict[str, np.ndarray]: with keys
+            - 'boxes': (N, 4) int array of (x1, y1, x2, y2)
+            - 'areas': (N,) int array of pixel counts
+            - 'centroids': (N, 2) float array of (x, y)
+    """
+    if not isinstance(mask, np.ndarray) or mask.ndim != 2:
+        raise MeasurementError("mask must be a 2D numpy array.")
+    if connectivity not in (4, 8):
+        raise MeasurementError("connectivity must be 4 or 8.")
+    if mask.dtype != np.uint8:
+        mask = (mask != 0).astype(np.uint8)
+
+    _, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=connectivity)
+    # Label 0 is the background
+    stats = stats[1:]
+    boxes = np.empty((stats.shape[0], 4), dtype=np.int32)
+    boxes[:, 0] = stats[:, cv2.CC_STAT_LEFT]
+    boxes[:, 1] = stats[:, cv2.CC_STAT_TOP]
+    boxes[:, 2] = stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH]
+    boxes[:, 3] = stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT]
+    return {
+        "boxes": boxes,
+        "areas": stats[:, cv2.CC_STAT_AREA].astype(np.int64),
+        "centroids": centroids[1:],
+    }
+
+
+def filter_objects(
+    measurements: dict[str, np.ndarray],
+    min_area: int | None = None,
+    max_area: int | None = None,
+    min_aspect: float | None = None,
+    max_aspect: float | None = None,
+    predicate=None
+) -> dict[str, np.ndarray]:
+    """
+    Keep only the objects that pass all given conditions.
+    All conditions are evaluated on the whole arrays at once.
+
+    Args:
+        measurements (dict[str, np.ndarray]): Output of measure_mask
+        min_area (int, optional): Smallest area to keep
+        max_area (int, optional): Largest area to keep
+        min_aspect (float, optional): Smallest width / height ratio to keep
+        max_aspect (float, optional): Largest width / height ratio to keep
+        predicate (callable, optional): Function taking the measurements dict and
+            returning a boolean array with one entry per object
+
+    Returns:
+        dict[str, np.ndarray]: The measurements of the kept objects
+    """
+    areas = measurements["areas"]
+    boxes = measurements["boxes"]
+    keep = np.ones(areas.shape[0], dtype=bool)
+    if min_area is not None:
+        keep &= areas >= min_area
+    if max_area is not None:
+        keep &= areas <= max_area
+    if min_aspect is not None or max_aspect is not None:
+        aspect = (boxes[:, 2] - boxes[:, 0]) / np.maximum(boxes[:, 3] - boxes[:, 1], 1)
+        if min_aspect is not None:
+            keep &= aspect >= min_aspect
+        if max_aspect is not None:
+            keep &= aspect <= max_aspect
+    if predicate is not None:
+        selected = np.asarray(predicate(measurements), dtype=bool)
+        if selected.shape != keep.shape:
+            raise MeasurementError("predicate must return one boolean per object.")
+        keep &= selected
+    return {key: value[keep] for key, value in measurements.items()}
+
+
+def measure_image(image_path: str, filters: dict | None = None, **segment_options) -> dict[str, np.ndarray]:
+    """
+    Load an image, segment it and measure (and optionally filter) its objects.
+
+    Args:
+        image_path (str): Path to the image file
+        filters (dict, optional): Keyword arguments for filter_objects
+        **segment_options: Keyword arguments for segment_objects
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise MeasurementError(f"Could not load image from path: {image_path}")
+    measurements = measure_mask(segment_objects(image, **segment_options))
+    if filters:
+        measurements = filter_objects(measurements, **filters)
+    return measurements
+
+
+def _measure_rows(job: tuple[str, dict | None, dict]) -> tuple[str, list[tuple], str | None]:
+    # Runs in a worker process, so it only takes and returns picklable values
+    (image_path, filters, segment_options) = job
+    name = os.path.basename(image_path)
+    try:
+        m = measure_image(image_path, filters, **segment_options)
+    except (MeasurementError, cv2.error) as e:
+        return name, [], str(e)
+    rows = [
+        (name, i, *m["boxes"][i].tolist(), int(m["areas"][i]), *np.round(m["centroids"][i], 2).tolist())
+        for i in range(m["areas"].shape[0])
+    ]
+    return name, rows, None
+
+
+def measure_directory(
+    directory: str,
+    output_path: str,
+    pattern: str = "*.jpg",
+    workers: int | None = None,
+    filters: dict | None = None,
+    status_path: str | None = None,
+    **segment_options
+) -> dict[str, str]:
+    """
+    Measure the objects in all images of a directory in a process pool
+    and write one CSV table with a row per object (see RESULT_COLUMNS),
+    and one with a row per image with its object count or error (see STATUS_COLUMNS).
+
+    Args:
+        directory (str): Directory with the inspection images
+        output_path (str): Path of the CSV file with the objects
+        pattern (str): Glob pattern for the image files
+        workers (int, optional): Number of processes, default is the number of CPUs
+        filters (dict, optional): Keyword arguments for filter_objects
+        status_path (str, optional): Path of the CSV file with the images,
+            default is output_path with an "_images" suffix
+        **segment_options: Keyword arguments for segment_objects
+
+    Returns:
+        dict[str, str]: Error messages for images that could not be processed, by file name
+    """
+    if not os.path.isdir(directory):
+        raise MeasurementError(f"Not a directory: {directory}")
+    # Checked here, a wrong name would otherwise fail in every worker
+    unknown = set(filters or {}) - set(inspect.signature(filter_objects).parameters) - {"measurements"}
+    if unknown:
+        raise MeasurementError(f"Unknown filters: {', '.join(sorted(unknown))}")
+    if status_path is None:
+        (stem, extension) = os.path.splitext(output_path)
+        status_path = f"{stem}_images{extension or '.csv'}"
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    jobs = [(path, filters, segment_options) for path in paths]
+    errors = {}
+    with open(output_path, "w", newline="") as f, open(status_path, "w", newline="") as g:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_COLUMNS)
+        status_writer = csv.writer(g)
+        status_writer.writerow(STATUS_COLUMNS)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Images are small jobs, so hand them out in chunks to keep the overhead down
+            chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+            for name, rows, error in pool.map(_measure_rows, jobs, chunksize=chunksize):
+                if error is not None:
+                    errors[name] = error
+                    status_writer.writerow((name, "", error))
+                else:
+                    status_writer.writerow((name, len(rows), ""))
+                writer.writerows(rows)
+    return errors
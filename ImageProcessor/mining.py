@@ -0,0 +1,390 @@
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2
+
+from detection import PATCH_SIZE, compute_hog_features, iou_matrix, non_max_suppression, window_batches
+from training import LinearDetector, load_patch_features
+
+
+class MiningError(Exception):
+    pass
+
+
+class PatchStore:
+    """
+    Growing store of hard negative patches, backed by a memory-mapped file.
+
+    The pixels live in a raw uint8 file of shape (N, height * width), the same layout
+    as negative_patches.npy, so the store can grow beyond RAM. Their HOG features are
+    computed once when a patch is added and kept in a second raw float32 file, so
+    retraining never recomputes them. Scores, boxes and source images are kept in a
+    small .npz file, for deduplication and for replacing the weakest patches once
+    max_patches is reached.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_patches: int = 100000,
+        patch_size: tuple[int, int] = PATCH_SIZE,
+        iou_threshold: float = 0.5,
+        pixels_per_cell: tuple[int, int] = (8, 8),
+        cells_per_block: tuple[int, int] = (2, 2)
+    ):
+        """
+        Args:
+            path (str): Path of the pixel file, an existing store is opened and extended
+            max_patches (int): Upper bound of the number of patches
+            patch_size (tuple[int, int]): (width, height) of the patches
+            iou_threshold (float): Patches from the same image overlapping a stored one
+                by more than this are duplicates
+            pixels_per_cell (tuple[int, int]): HOG cell size of the stored features
+            cells_per_block (tuple[int, int]): HOG block size in cells of the stored features
+        """
+        if not isinstance(max_patches, int) or max_patches <= 0:
+            raise MiningError("max_patches must be a positive integer.")
+        self.path = path
+        self.features_path = path + ".hog.f32"
+        self.meta_path = path + ".meta.npz"
+        self.max_patches = max_patches
+        self.patch_size = tuple(patch_size)
+        self.iou_threshold = iou_threshold
+        self.hog_options = {"pixels_per_cell": tuple(pixels_per_cell), "cells_per_block": tuple(cells_per_block)}
+        self.patch_bytes = patch_size[0] * patch_size[1]
+        (w, h) = self.patch_size
+        self.n_features = compute_hog_features(np.zeros((1, h, w), dtype=np.uint8), **self.hog_options).shape[1]
+        self._memmap = None
+        self._features_memmap = None
+        self.sources = []
+        if os.path.isfile(self.meta_path):
+            with np.load(self.meta_path) as meta:
+                if tuple(meta["pixels_per_cell"]) != self.hog_options["pixels_per_cell"] or tuple(meta["cells_per_block"]) != self.hog_options["cells_per_block"]:
+                    raise MiningError(f"The store was created with other HOG parameters: {path}")
+                self.scores = meta["scores"]
+                self.boxes = meta["boxes"]
+                self.source_ids = meta["source_ids"]
+                self.sources = [str(source) for source in meta["sources"]]
+        else:
+            self.scores = np.empty(0, dtype=np.float32)
+            self.boxes = np.empty((0, 4), dtype=np.int32)
+            self.source_ids = np.empty(0, dtype=np.int32)
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        features_size = os.path.getsize(self.features_path) if os.path.isfile(self.features_path) else 0
+        if size != len(self.scores) * self.patch_bytes or features_size != len(self.scores) * self.n_features * 4:
+            raise MiningError(f"Patch file and metadata do not match: {path}")
+        if len(self.scores) > max_patches:
+            raise MiningError(f"The store holds {len(self.scores)} patches, more than max_patches: {path}")
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @property
+    def patches(self) -> np.ndarray:
+        """
+        Read-only (N, height, width) view of the stored patches, without loading them into RAM.
+        """
+        (w, h) = self.patch_size
+        if len(self) == 0:
+            return np.empty((0, h, w), dtype=np.uint8)
+        if self._memmap is None:
+            self._memmap = np.memmap(self.path, dtype=np.uint8, mode="r", shape=(len(self), h, w))
+        return self._memmap
+
+    @property
+    def features(self) -> np.ndarray:
+        """
+        Read-only (N, F) float32 view of the HOG features of the stored patches.
+        """
+        if len(self) == 0:
+            return np.empty((0, self.n_features), dtype=np.float32)
+        if self._features_memmap is None:
+            self._features_memmap = np.memmap(self.features_path, dtype=np.float32, mode="r", shape=(len(self), self.n_features))
+        return self._features_memmap
+
+    def _source_id(self, source: str) -> int:
+        if source not in self.sources:
+            self.sources.append(source)
+        return self.sources.index(source)
+
+    def add(self, patches: np.ndarray, boxes: np.ndarray, scores: np.ndarray, source: str) -> int:
+        """
+        Add the patches found in one image.
+
+        Patches overlapping each other or a patch stored earlier for the same image
+        are dropped, keeping the higher score. Once the store is full, new patches
+        replace the lowest scoring ones if they score higher.
+
+        Args:
+            patches (np.ndarray): (N, height, width) uint8 patches
+            boxes (np.ndarray): (N, 4) boxes (x, y, w, h) in the source image
+            scores (np.ndarray): (N,) detector scores
+            source (str): Name of the source image
+
+        Returns:
+            int: Number of patches that were added
+        """
+        (w, h) = self.patch_size
+        patches = np.asarray(patches, dtype=np.uint8).reshape(-1, h, w)
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float32).ravel()
+        if not (len(patches) == len(boxes) == len(scores)):
+            raise MiningError("patches, boxes and scores must have the same length.")
+        keep = non_max_suppression(boxes, scores, self.iou_threshold)
+        source_id = self._source_id(source)
+        same_source = self.source_ids == source_id
+        if keep.size and same_source.any():
+            overlaps = iou_matrix(boxes[keep], self.boxes[same_source]).max(axis=1)
+            keep = keep[overlaps <= self.iou_threshold]
+
+        free = max(0, self.max_patches - len(self))
+        (appended, replaced) = (keep[:free], keep[free:])
+        features = np.empty((len(patches), self.n_features), dtype=np.float32)
+        if keep.size:
+            # Only the patches that can still be stored, the duplicates are never described
+            features[keep] = compute_hog_features(patches[keep], **self.hog_options)
+        if replaced.size:
+            # Weakest stored patches first, each replaced only by a stronger new one
+            weakest = np.argsort(self.scores, kind="stable")[:replaced.size]
+            stronger = scores[replaced] > self.scores[weakest]
+            (replaced, weakest) = (replaced[stronger], weakest[stronger])
+            if replaced.size:
+                feature_bytes = self.n_features * 4
+                with open(self.path, "r+b") as f, open(self.features_path, "r+b") as g:
+                    for (index, slot) in zip(replaced, weakest):
+                        f.seek(int(slot) * self.patch_bytes)
+                        f.write(np.ascontiguousarray(patches[index]).tobytes())
+                        g.seek(int(slot) * feature_bytes)
+                        g.write(features[index].tobytes())
+                self.scores[weakest] = scores[replaced]
+                self.boxes[weakest] = boxes[replaced]
+                self.source_ids[weakest] = source_id
+        if appended.size:
+            with open(self.path, "ab") as f:
+                f.write(np.ascontiguousarray(patches[appended]).tobytes())
+            with open(self.features_path, "ab") as f:
+                f.write(features[appended].tobytes())
+            self.scores = np.concatenate((self.scores, scores[appended]))
+            self.boxes = np.concatenate((self.boxes, boxes[appended]))
+            self.source_ids = np.concatenate((self.source_ids, np.full(appended.size, source_id, dtype=np.int32)))
+        # The files changed, the next access maps them again
+        self._memmap = None
+        self._features_memmap = None
+        self.flush()
+        return int(appended.size + replaced.size)
+
+    def flush(self):
+        """
+        Write the metadata, so the store can be opened again later.
+        """
+        temporary_path = self.meta_path + ".tmp.npz"
+        np.savez(
+            temporary_path,
+            scores=self.scores,
+            boxes=self.boxes,
+            source_ids=self.source_ids,
+            sources=np.array(self.sources, dtype=str),
+            pixels_per_cell=self.hog_options["pixels_per_cell"],
+            cells_per_block=self.hog_options["cells_per_block"]
+        )
+        os.replace(temporary_path, self.meta_path)
+
+
+def _score(detector, features: np.ndarray) -> np.ndarray:
+    decision_function = getattr(detector, "decision_function", None)
+    if decision_function is not None:
+        return np.asarray(decision_function(features), dtype=np.float32)
+    # Classifiers without scores, e.g. pickled random forests
+    return detector.predict_proba(features)[:, 1].astype(np.float32) - 0.5
+
+
+def scan_image(
+    image: np.ndarray,
+    detector,
+    scales: tuple[float, ...] = (1.0, 0.75, 0.5),
+    step: int = 8,
+    threshold: float = 0.0,
+    batch_size: int = 4096
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score every window of an image pyramid with a detector.
+
+    Args:
+        image (np.ndarray): Grey scale image
+        detector: LinearDetector or fitted scikit-learn classifier on HOG features
+        scales (tuple[float, ...]): Pyramid levels, 1.0 is the original size
+        step (int): Window step in pixels, on every level
+        threshold (float): Windows scoring above this are returned
+        batch_size (int): Windows per HOG and scoring batch
+
+    Returns:
+        tuple: (N, height, width) patches, (N, 4) boxes (x, y, w, h) in image
+            coordinates and (N,) scores of the windows above the threshold
+    """
+    if not isinstance(image, np.ndarray) or image.ndim != 2:
+        raise MiningError("image must be a 2D numpy array.")
+    hog_options = {}
+    if isinstance(detector, LinearDetector):
+        hog_options = {"pixels_per_cell": detector.pixels_per_cell, "cells_per_block": detector.cells_per_block}
+    (w, h) = PATCH_SIZE
+    (all_patches, all_boxes, all_scores) = ([], [], [])
+    for scale in scales:
+        scaled = image if scale == 1.0 else cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        # Only one batch of overlapping windows is copied out of the image at a time
+        for (positions, batch) in window_batches(scaled, PATCH_SIZE, step, step, batch_size):
+            scores = _score(detector, compute_hog_features(batch, **hog_options))
+            hits = np.flatnonzero(scores > threshold)
+            if hits.size == 0:
+                continue
+            all_patches.append(batch[hits])
+            # Back to the coordinates of the original image
+            boxes = np.column_stack((positions[hits], np.tile((w, h), (hits.size, 1)))) / scale
+            all_boxes.append(np.round(boxes).astype(np.int32))
+            all_scores.append(scores[hits])
+    if not all_scores:
+        return np.empty((0, h, w), dtype=image.dtype), np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float32)
+    return np.concatenate(all_patches), np.concatenate(all_boxes), np.concatenate(all_scores)
+
+
+def _mine_image(args):
+    (image_path, detector, scales, step, threshold, max_per_image) = args
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return image_path, None, f"Could not load image from path: {image_path}"
+    (patches, boxes, scores) = scan_image(image, detector, scales, step, threshold)
+    # Only the strongest false positives go back to the parent process
+    keep = non_max_suppression(boxes, scores, 0.5)[:max_per_image]
+    return image_path, (patches[keep], boxes[keep], scores[keep]), None
+
+
+def mine_hard_negatives(
+    image_paths: list[str],
+    detector,
+    store: PatchStore,
+    scales: tuple[float, ...] = (1.0, 0.75, 0.5),
+    step: int = 8,
+    threshold: float = 0.0,
+    max_per_image: int = 200,
+    workers: int | None = None
+) -> tuple[int, dict[str, str]]:
+    """
+    Scan face-free images in a process pool and add every detection to the store,
+    since all of them are false positives.
+
+    Args:
+        image_paths (list[str]): Images without faces
+        detector: LinearDetector or fitted scikit-learn classifier
+        store (PatchStore): Store for the hard negatives, written by this process only
+        scales, step, threshold: See scan_image
+        max_per_image (int): Strongest detections kept per image
+        workers (int, optional): Number of processes, default is the number of CPUs
+
+    Returns:
+        tuple[int, dict[str, str]]: Number of added patches and error messages by image path
+    """
+    jobs = [(path, detector, scales, step, threshold, max_per_image) for path in image_paths]
+    (added, errors) = (0, {})
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (path, found, error) in pool.map(_mine_image, jobs):
+            if error is not None:
+                errors[path] = error
+                continue
+            added += store.add(*found, source=os.path.basename(path))
+    return added, errors
+
+
+def _default_estimator():
+    from sklearn.svm import LinearSVC
+    return LinearSVC(C=0.01, class_weight="balanced")
+
+
+def train_with_hard_negatives(
+    positive_features: np.ndarray,
+    negative_features: np.ndarray,
+    image_paths: list[str],
+    store: PatchStore,
+    rounds: int = 3,
+    make_estimator=_default_estimator,
+    workers: int | None = None,
+    **mining_options
+) -> tuple[LinearDetector, list[dict]]:
+    """
+    Train a linear detector, then alternate mining hard negatives and retraining.
+
+    Args:
+        positive_features (np.ndarray): HOG features of the face patches, computed with store.hog_options
+        negative_features (np.ndarray): HOG features of the initial non-face patches, likewise
+        image_paths (list[str]): Images without faces to mine
+        store (PatchStore): Store for the hard negatives
+        rounds (int): Number of mining and retraining rounds
+        make_estimator (callable): Returns a new, unfitted linear scikit-learn classifier
+        workers (int, optional): Number of processes, default is the number of CPUs
+        **mining_options: Keyword arguments for mine_hard_negatives
+
+    Returns:
+        tuple[LinearDetector, list[dict]]: The final detector and one entry per round with
+            the number of added patches, the store size and the mining errors
+    """
+    if not isinstance(rounds, int) or rounds < 0:
+        raise MiningError("rounds must be a non-negative integer.")
+    X_base = np.vstack((positive_features, negative_features))
+    y_base = np.hstack((np.ones(len(positive_features), dtype=np.int64), np.zeros(len(negative_features), dtype=np.int64)))
+
+    def fit(hard_features):
+        X = np.vstack((X_base, hard_features)) if len(hard_features) else X_base
+        y = np.hstack((y_base, np.zeros(len(hard_features), dtype=np.int64)))
+        # The detector must describe windows like the store describes its patches
+        return LinearDetector.from_estimator(make_estimator().fit(X, y), **store.hog_options)
+
+    detector = fit(np.empty((0, X_base.shape[1])))
+    history = []
+    for round_number in range(1, rounds + 1):
+        (added, errors) = mine_hard_negatives(image_paths, detector, store, workers=workers, **mining_options)
+        history.append({"round": round_number, "added": added, "store_size": len(store), "errors": errors})
+        if added == 0:
+            # Nothing new was found, retraining would give the same detector
+            break
+        # The store describes each patch once when it is added, nothing is recomputed here
+        detector = fit(store.features)
+    return detector, history
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train the HOG face detector with hard negative mining.")
+    parser.add_argument("--positive", default="data/positive_patches.npy", help="Face patches, (N, 62*47) .npy file")
+    parser.add_argument("--negative", default="data/negative_patches.npy", help="Non-face patches, (N, 62*47) .npy file")
+    parser.add_argument("--images", required=True, help="Glob pattern of images without faces, e.g. 'backgrounds/*.jpg'")
+    parser.add_argument("--store", default="data/hard_negatives.u8", help="Path of the hard negative patch store")
+    parser.add_argument("--rounds", type=int, default=3, help="Mining and retraining rounds")
+    parser.add_argument("--max-patches", type=int, default=100000, help="Upper bound of the stored hard negatives")
+    parser.add_argument("--step", type=int, default=8, help="Window step in pixels")
+    parser.add_argument("--output", default="face_detector.npz", help="Path of the trained detector")
+    parser.add_argument("--workers", type=int, help="Number of processes, default is the number of CPUs")
+    args = parser.parse_args(argv)
+
+    image_paths = sorted(glob.glob(args.images))
+    if not image_paths:
+        print(f"No images match: {args.images}", file=sys.stderr)
+        return 1
+    positive = load_patch_features(args.positive, workers=args.workers)
+    negative = load_patch_features(args.negative, workers=args.workers)
+    store = PatchStore(args.store, args.max_patches)
+    detector, history = train_with_hard_negatives(
+        positive, negative, image_paths, store, args.rounds, workers=args.workers, step=args.step
+    )
+    for entry in history:
+        print(f"round {entry['round']}: {entry['added']} hard negatives added, {entry['store_size']} stored, {len(entry['errors'])} errors")
+    detector.save(args.output)
+    print(f"Saved detector to {args.output}")
+    return 0
+
+
+# Access point for hard negative mining, e.g.
+# python mining.py --images "backgrounds/*.jpg" --rounds 3 --output face_detector.npz
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+
+import queue
+import threading
+
+import numpy as np
+
+from detection import PATCH_SIZE
+
+
+class PatchDatasetError(Exception):
+    pass
+
+
+def augment_patches(
+    patches: np.ndarray,
+    rng: np.random.Generator,
+    flip: bool = True,
+    max_shift: int = 2,
+    brightness: float = 0.2
+) -> np.ndarray:
+    """
+    Return randomly augmented copies of a batch of grey scale patches.
+
+    Args:
+        patches (np.ndarray): (N, height, width) uint8 or floating point patches
+        rng (np.random.Generator): Source of randomness
+        flip (bool): Mirror half of the patches horizontally (faces are roughly symmetric)
+        max_shift (int): Shift each patch by up to this many pixels in x and y,
+            the border pixels are repeated
+        brightness (float): Multiply each patch by a factor in 1 +- brightness
+
+    Returns:
+        np.ndarray: (N, height, width) patches of the input dtype. uint8 patches are
+            clipped to 0..255, floating point patches to 0 only, their range is not known.
+    """
+    if patches.ndim != 3:
+        raise PatchDatasetError("patches must have shape (N, height, width).")
+    _check_dtype(patches.dtype)
+    if not isinstance(max_shift, int) or max_shift < 0:
+        raise PatchDatasetError("max_shift must be a non-negative integer.")
+    n = patches.shape[0]
+    out = np.array(patches)
+    if flip:
+        flipped = rng.random(n) < 0.5
+        out[flipped] = out[flipped, :, ::-1]
+    if max_shift > 0:
+        (h, w) = out.shape[1:]
+        padded = np.pad(out, ((0, 0), (max_shift, max_shift), (max_shift, max_shift)), mode="edge")
+        shifts = rng.integers(0, 2 * max_shift + 1, size=(n, 2))
+        for i, (dy, dx) in enumerate(shifts):
+            out[i] = padded[i, dy:dy + h, dx:dx + w]
+    if brightness > 0:
+        factors = rng.uniform(1 - brightness, 1 + brightness, size=(n, 1, 1)).astype(np.float32)
+        if out.dtype == np.uint8:
+            out = np.clip(out * factors, 0, 255).astype(np.uint8)
+        else:
+            out = np.maximum(out * factors, 0).astype(out.dtype)
+    return out
+
+
+class PatchDataset:
+    """
+    Face and non-face patches for training, read lazily from memory-mapped .npy files.
+
+    The files keep the (N, height * width) layout of positive_patches.npy and
+    negative_patches.npy. The patches are exposed as (N, height, width) views of
+    the mapped files, so only the rows of a mini-batch are ever read into RAM:
+
+        dataset = PatchDataset.open("data/positive_patches.npy", "data/negative_patches.npy")
+        for X, y in dataset.batches(256, augment=True):
+            ...
+    """
+
+    def __init__(self, patch_size: tuple[int, int] = PATCH_SIZE):
+        """
+        Args:
+            patch_size (tuple[int, int]): (width, height) of the patches
+        """
+        self.patch_size = tuple(patch_size)
+        # (patches, label) per source, patches are (N, height, width) views
+        self.parts = []
+
+    @classmethod
+    def open(cls, positive_path: str, negative_path: str, patch_size: tuple[int, int] = PATCH_SIZE) -> "PatchDataset":
+        """
+        Map a positive and a negative patch file without reading them.
+        """
+        dataset = cls(patch_size)
+        dataset.add(_load(positive_path), 1)
+        dataset.add(_load(negative_path), 0)
+        return dataset
+
+    def add(self, patches: np.ndarray, label: int):
+        """
+        Add patches with the same label, e.g. the hard negatives of a mining.PatchStore.
+
+        Args:
+            patches (np.ndarray): (N, height * width) or (N, height, width) uint8 or floating
+                point array, usually memory-mapped. Batches mixing both are floating point.
+            label (int): 1 for faces, 0 for non-faces
+        """
+        (w, h) = self.patch_size
+        if not isinstance(patches, np.ndarray) or patches.ndim not in (2, 3):
+            raise PatchDatasetError("patches must be a 2D or 3D numpy array.")
+        if patches.shape[1:] not in ((w * h,), (h, w)):
+            raise PatchDatasetError(f"patches must have shape (N, {w * h}) or (N, {h}, {w}).")
+        _check_dtype(patches.dtype)
+        # A reshape of a C-contiguous (memory-mapped) array is a view, no copy is made
+        self.parts.append((patches.reshape(-1, h, w), int(label)))
+
+    def __len__(self) -> int:
+        return sum(len(patches) for patches, _ in self.parts)
+
+    @property
+    def positives(self) -> np.ndarray:
+        return self._with_label(1)
+
+    @property
+    def negatives(self) -> np.ndarray:
+        return self._with_label(0)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """
+        dtype of the gathered patches, the common dtype of all sources.
+        """
+        return np.result_type(*(patches.dtype for patches, _ in self.parts)) if self.parts else np.dtype(np.uint8)
+
+    def _with_label(self, label: int) -> np.ndarray:
+        parts = [patches for patches, part_label in self.parts if part_label == label]
+        if len(parts) == 1:
+            return parts[0]
+        (w, h) = self.patch_size
+        # Several sources can't be one view, so this is the only case that copies
+        return np.concatenate(parts) if parts else np.empty((0, h, w), dtype=self.dtype)
+
+    @property
+    def labels(self) -> np.ndarray:
+        return np.concatenate([np.full(len(patches), label, dtype=np.int64) for patches, label in self.parts]) if self.parts else np.empty(0, dtype=np.int64)
+
+    def gather(self, indices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Read the patches at the given dataset indices.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (B, height, width) patches and (B,) labels, in the order of indices
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        (w, h) = self.patch_size
+        out = np.empty((len(indices), h, w), dtype=self.dtype)
+        labels = np.empty(len(indices), dtype=np.int64)
+        offset = 0
+        for patches, label in self.parts:
+            selected = np.flatnonzero((indices >= offset) & (indices < offset + len(patches)))
+            if selected.size:
+                rows = indices[selected] - offset
+                # Sorted reads touch the mapped file front to back
+                order = np.argsort(rows, kind="stable")
+                out[selected[order]] = patches[rows[order]]
+                labels[selected] = label
+            offset += len(patches)
+        return out, labels
+
+    def batches(
+        self,
+        batch_size: int = 256,
+        shuffle: bool = True,
+        augment: bool = False,
+        seed: int | None = None,
+        prefetch: int = 2,
+        drop_last: bool = False,
+        **augment_options
+    ):
+        """
+        Yield (patches, labels) mini-batches for one pass over the dataset.
+
+        The batches are read and augmented in a background thread, up to `prefetch`
+        batches ahead, so reading from disk overlaps with training.
+
+        Args:
+            batch_size (int): Patches per batch
+            shuffle (bool): Visit the patches in random order
+            augment (bool): Augment the patches, see augment_patches
+            seed (int, optional): Seed for shuffling and augmentation
+            prefetch (int): Number of batches prepared ahead
+            drop_last (bool): Skip the last batch if it is smaller than batch_size
+            **augment_options: Keyword arguments for augment_patches
+        """
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise PatchDatasetError("batch_size must be a positive integer.")
+        if not isinstance(prefetch, int) or prefetch <= 0:
+            raise PatchDatasetError("prefetch must be a positive integer.")
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self)) if shuffle else np.arange(len(self))
+        stops = range(batch_size, len(order) + (0 if drop_last else batch_size), batch_size)
+        ready = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            # Wait for space, but give up when the consumer has stopped iterating
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for end in stops:
+                    (patches, labels) = self.gather(order[end - batch_size:end])
+                    if augment:
+                        patches = augment_patches(patches, rng, **augment_options)
+                    if not put((patches, labels)):
+                        return
+                put(done)
+            except BaseException as e:
+                # Raised again in the consuming thread
+                put(e)
+
+        thread = threading.Thread(target=produce, name="patch-batches", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+
+def _check_dtype(dtype: np.dtype):
+    if dtype != np.uint8 and not np.issubdtype(dtype, np.floating):
+        raise PatchDatasetError(f"patches must be uint8 or floating point, not: {dtype}")
+
+
+def _load(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        raise PatchDatasetError(f"Could not load patches from path: {path}") from e
@@ -0,0 +1,24 @@
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# File I/O, OpenCV and imencode release the GIL, so threads are enough to use all cores
+# without copying images between processes. One pool bounded by the number of CPUs is
+# shared by the async processors, the batches and the encoder, so they don't oversubscribe
+# the cores. Jobs on the pool must not wait for other jobs on it.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared executor for image work, creating it on first use.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="image")
+    return _executor
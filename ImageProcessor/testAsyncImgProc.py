@@ -0,0 +1,94 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from ImgProc import ImageProcessor, ImageProcessorError
+from AsyncImgProc import AsyncImageProcessor
+
+
+class TestAsyncImageProcessor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_open(self):
+        processor = await AsyncImageProcessor.open("5.jpg")
+        np.testing.assert_array_equal(processor.image, ImageProcessor("5.jpg").image)
+
+    async def test_open_non_existing_file(self):
+        with self.assertRaises(ImageProcessorError) as context:
+            await AsyncImageProcessor.open("non_existing_file.jpg")
+        self.assertEqual(str(context.exception), "Could not load image from path: non_existing_file.jpg")
+
+    async def test_chained_operations(self):
+        processor = await AsyncImageProcessor.open("5.jpg")
+        await processor.resize(scale=0.5).rotate(angle=30).crop(x1=10, y1=10, width=100, height=50)
+        expected = ImageProcessor("5.jpg")
+        expected.resize(scale=0.5)
+        expected.rotate(angle=30)
+        expected.crop(x1=10, y1=10, width=100, height=50)
+        np.testing.assert_array_equal(processor.image, expected.image)
+
+    async def test_errors_are_raised_on_await(self):
+        processor = await AsyncImageProcessor.open("5.jpg")
+        with self.assertRaises(ImageProcessorError) as context:
+            await processor.resize(scale=-1)
+        self.assertEqual(str(context.exception), "Scale must be a positive number.")
+
+    async def test_save(self):
+        processor = await AsyncImageProcessor.open("5.jpg")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "small.png")
+            await processor.resize(100, 50).save(path)
+            saved = ImageProcessor(path)
+        np.testing.assert_array_equal(saved.image, processor.image)
+
+    async def test_semaphore_limits_concurrency(self):
+        semaphore = asyncio.Semaphore(2)
+        processors = [
+            AsyncImageProcessor(ImageProcessor("5.jpg"), semaphore=semaphore)
+            for i in range(6)
+        ]
+        running = []
+        peak = []
+        lock = threading.Lock()
+        original_resize = ImageProcessor.resize
+
+        def slow_resize(self, *args, **kwargs):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            return original_resize(self, *args, **kwargs)
+
+        ImageProcessor.resize = slow_resize
+        try:
+            await asyncio.gather(*(p.resize(scale=0.1).run() for p in processors))
+        finally:
+            ImageProcessor.resize = original_resize
+        self.assertLessEqual(max(peak), 2)
+
+    async def test_cancel_skips_remaining_operations(self):
+        processor = AsyncImageProcessor(ImageProcessor("5.jpg"))
+        started = threading.Event()
+        original_crop = processor.processor.crop
+
+        def slow_crop(*args, **kwargs):
+            started.set()
+            time.sleep(0.1)
+            return original_crop(*args, **kwargs)
+
+        processor.processor.crop = slow_crop
+        task = asyncio.create_task(processor.crop(x1=0, y1=0, width=100, height=100).resize(10, 10).run())
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        # The crop finished, the resize was dropped
+        self.assertEqual(processor.image.shape[:2], (100, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
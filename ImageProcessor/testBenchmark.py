@@ -0,0 +1,57 @@
+import os
+import time
+import unittest
+import numpy as np
+from benchmark import MIN_SAMPLES, compare_results, time_function, write_synthetic_video
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_time_function_reports_percentiles(self):
+        result = time_function(lambda: sum(range(1000)), repeat=10, warmup=1, items=1000)
+        self.assertEqual(result["repeat"], 10)
+        self.assertLessEqual(result["p50_ms"], result["p90_ms"])
+        self.assertLessEqual(result["p90_ms"], result["p99_ms"])
+        self.assertGreater(result["throughput_per_s"], 0)
+        self.assertGreaterEqual(result["peak_memory_mb"], 0)
+
+    def test_time_function_stops_after_budget(self):
+        result = time_function(lambda: None, repeat=1000, warmup=0, max_seconds=0.0)
+        self.assertEqual(result["repeat"], MIN_SAMPLES)
+
+    def test_setup_is_not_timed(self):
+        calls = []
+        result = time_function(lambda: calls.append("fn"), repeat=5, warmup=1, setup=lambda: (calls.append("setup"), time.sleep(0.01)))
+        self.assertEqual(calls, ["setup", "fn"] * 7)
+        self.assertLess(result["p99_ms"], 5)
+
+    def test_compare_results(self):
+        baseline = {"a": {"p50_ms": 10.0}, "b": {"p50_ms": 10.0}}
+        results = {"a": {"p50_ms": 11.0}, "b": {"p50_ms": 13.0}, "new": {"p50_ms": 1.0}}
+        regressions = compare_results(results, baseline, threshold=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("b:"))
+
+    def test_compare_peak_memory(self):
+        baseline = {"a": {"p50_ms": 10.0, "peak_memory_mb": 10.0}, "b": {"p50_ms": 10.0, "peak_memory_mb": 10.0}, "c": {"p50_ms": 10.0, "peak_memory_mb": 0.1}}
+        results = {"a": {"p50_ms": 10.0, "peak_memory_mb": 11.0}, "b": {"p50_ms": 10.0, "peak_memory_mb": 20.0}, "c": {"p50_ms": 10.0, "peak_memory_mb": 0.5}}
+        regressions = compare_results(results, baseline, memory_threshold=0.2)
+        # c grew by 400 percent, but less than MEMORY_NOISE_MB
+        self.assertEqual(regressions, ["b: peak_memory_mb 10.00 -> 20.00 (+100%)"])
+
+    def test_synthetic_video_is_keyed_by_source(self):
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        first = write_synthetic_video(frame, 2)
+        other = write_synthetic_video(frame + 1, 2)
+        try:
+            self.assertNotEqual(first, other)
+            self.assertEqual(write_synthetic_video(frame, 2), first)
+            self.assertIn("64x48", first)
+            self.assertFalse([name for name in os.listdir(os.path.dirname(first)) if name.startswith("cv_benchmark_") and name.endswith(".tmp.avi")])
+        finally:
+            os.remove(first)
+            os.remove(other)
+
+
+if __name__ == "__main__":
+    unittest.main()
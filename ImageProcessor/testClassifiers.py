@@ -0,0 +1,41 @@
+import threading
+import unittest
+from classifiers import ClassifierError, get_cascade, loaded_cascades, prewarm
+
+
+class TestClassifiers(unittest.TestCase):
+
+    def test_same_instance_within_thread(self):
+        self.assertIs(get_cascade(), get_cascade())
+        self.assertFalse(get_cascade().empty())
+
+    def test_own_instance_per_thread(self):
+        main_instance = get_cascade()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_cascade()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], main_instance)
+
+    def test_lazy_loading_and_prewarm(self):
+        names = []
+
+        def worker():
+            names.append(loaded_cascades())
+            prewarm()
+            names.append(loaded_cascades())
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertEqual(names[0], ())
+        self.assertEqual(names[1], ("haarcascade_frontalface_default.xml",))
+
+    def test_missing_cascade(self):
+        with self.assertRaises(ClassifierError) as context:
+            get_cascade("no_such_cascade.xml")
+        self.assertEqual(str(context.exception), "Could not find cascade: no_such_cascade.xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
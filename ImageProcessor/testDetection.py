@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from detection import DetectionError, extract_windows, iou_matrix, non_max_suppression, sliding_window, window_batches
+
+
+class TestDetection(unittest.TestCase):
+
+    def test_extract_windows_matches_sliding_window(self):
+        image = np.arange(100 * 120, dtype=np.uint16).reshape(100, 120)
+        positions, windows = extract_windows(image, (47, 62), 10, 10)
+        expected = list(sliding_window(image, (47, 62), 10, 10))
+        self.assertEqual(len(windows), len(expected))
+        for (x, y), window, ((ex, ey), expected_window) in zip(positions, windows, expected):
+            self.assertEqual((x, y), (ex, ey))
+            np.testing.assert_array_equal(window, expected_window)
+
+    def test_window_batches_match_extract_windows(self):
+        image = np.arange(100 * 160, dtype=np.uint16).reshape(100, 160)
+        (positions, windows) = extract_windows(image, (47, 62), 10, 10)
+        batches = list(window_batches(image, (47, 62), 10, 10, batch_size=25))
+        # 12 windows per row, so two rows per batch
+        self.assertEqual([len(batch) for _, batch in batches], [24, 24])
+        np.testing.assert_array_equal(np.concatenate([p for p, _ in batches]), positions)
+        np.testing.assert_array_equal(np.concatenate([w for _, w in batches]), windows)
+        self.assertEqual(list(window_batches(image[:50], (47, 62))), [])
+
+    def test_iou_matrix(self):
+        boxes = np.array([[0, 0, 10, 10], [5, 0, 10, 10], [20, 20, 5, 5]])
+        iou = iou_matrix(boxes, boxes)
+        np.testing.assert_allclose(np.diag(iou), 1.0)
+        self.assertAlmostEqual(iou[0, 1], 50 / 150)
+        self.assertEqual(iou[0, 2], 0.0)
+
+    def test_non_max_suppression(self):
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [50, 50, 10, 10], [51, 50, 10, 10]])
+        scores = np.array([0.5, 0.9, 0.7, 0.8])
+        np.testing.assert_array_equal(non_max_suppression(boxes, scores, 0.3), [1, 3])
+        self.assertEqual(len(non_max_suppression(np.empty((0, 4)), np.empty(0))), 0)
+
+    def test_non_max_suppression_length_mismatch(self):
+        with self.assertRaises(DetectionError) as context:
+            non_max_suppression(np.zeros((2, 4)), np.zeros(3))
+        self.assertEqual(str(context.exception), "boxes and scores must have the same length.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import cv2
+from encoding import EncodingError, build_params, encode, encode_many, format_from_path, write
+
+
+class TestEncoding(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Smooth gradient plus a little noise, so the quality settings make a difference
+        gradient = np.linspace(0, 200, 96, dtype=np.float32)
+        base = np.stack([np.add.outer(gradient[:64], gradient)] * 3, axis=2) / 2
+        self.image = np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+
+    def test_encode_returns_memoryview_without_copy(self):
+        data = encode(self.image, "jpeg")
+        self.assertIsInstance(data, memoryview)
+        self.assertIsInstance(data.obj, np.ndarray)
+        self.assertEqual(bytes(data[:2]), b"\xff\xd8")
+
+    def test_png_round_trip_is_lossless(self):
+        data = encode(self.image, "png", compression=9)
+        decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        np.testing.assert_array_equal(cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB), self.image)
+
+    def test_png_compression_level(self):
+        self.assertLess(len(encode(self.image, "png", compression=9)), len(encode(self.image, "png", compression=0)))
+
+    def test_jpeg_quality(self):
+        self.assertLess(len(encode(self.image, "jpg", quality=20)), len(encode(self.image, "jpg", quality=95)))
+
+    def test_jpeg_progressive(self):
+        data = bytes(encode(self.image, "jpeg", progressive=True))
+        # Start of frame marker of a progressive JPEG
+        self.assertIn(b"\xff\xc2", data)
+
+    def test_webp(self):
+        lossy = encode(self.image, "webp", quality=50)
+        lossless = encode(self.image, ".WEBP", lossless=True)
+        self.assertEqual(bytes(lossy[8:12]), b"WEBP")
+        decoded = cv2.imdecode(np.frombuffer(lossless, np.uint8), cv2.IMREAD_COLOR)
+        np.testing.assert_array_equal(cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB), self.image)
+
+    def test_grey_scale_image(self):
+        grey = self.image[..., 0]
+        decoded = cv2.imdecode(np.frombuffer(encode(grey, "png"), np.uint8), cv2.IMREAD_UNCHANGED)
+        np.testing.assert_array_equal(decoded, grey)
+
+    def test_encode_many_keeps_order(self):
+        images = np.stack([self.image, 255 - self.image, self.image // 2])
+        encoded = encode_many(images, "png")
+        self.assertEqual([bytes(data) for data in encoded], [bytes(encode(image, "png")) for image in images])
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "image.jpg")
+            write(path, self.image, quality=90, optimize=True)
+            self.assertTrue(os.path.getsize(path) > 0)
+
+    def test_invalid_options(self):
+        cases = [
+            (lambda: build_params("png", quality=50), "quality is not supported for format: png"),
+            (lambda: build_params("jpeg", quality=101), "quality must be an integer in range 0..100."),
+            (lambda: build_params("webp", quality=0), "quality must be an integer in range 1..100."),
+            (lambda: build_params("png", progressive=True), "progressive and optimize are only supported for jpeg, not: png"),
+            (lambda: build_params("jpeg", compression=3), "compression is only supported for png, not: jpeg"),
+            (lambda: build_params("png", compression=10), "compression must be an integer in range 0..9."),
+            (lambda: build_params("jpeg", lossless=True), "lossless is only supported for webp, not: jpeg"),
+            (lambda: build_params("webp", quality=80, lossless=True), "quality can't be combined with lossless."),
+            (lambda: format_from_path("image"), "Could not determine the format of path: image"),
+            (lambda: encode(self.image, "unknown"), "Could not encode image as unknown"),
+        ]
+        for fn, message in cases:
+            with self.assertRaises(EncodingError) as context:
+                fn()
+            self.assertEqual(str(context.exception), message)
+
+
+if __name__ == "__main__":
+    unittest.main()
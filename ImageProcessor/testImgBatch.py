@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import cv2
+from ImgProc import ImageProcessor, ImageProcessorError
+from ImgBatch import ImageBatch
+
+
+def processor_result(operation):
+    processor = ImageProcessor("5.jpg")
+    operation(processor)
+    return processor.image
+
+
+class TestImageBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = ImageBatch.from_files(["5.jpg", "5.jpg", "5.jpg"])
+
+    def assert_matches_processor(self, operation):
+        operation(self.batch)
+        expected = processor_result(operation)
+        self.assertEqual(self.batch.images.shape[0], 3)
+        for image in self.batch.images:
+            np.testing.assert_array_equal(image, expected)
+
+    def test_from_files(self):
+        self.assertEqual(self.batch.images.shape[0], 3)
+        self.assertTrue(self.batch.images.flags["C_CONTIGUOUS"])
+        np.testing.assert_array_equal(self.batch[1], ImageProcessor("5.jpg").image)
+
+    def test_from_files_with_missing_file(self):
+        with self.assertRaises(ImageProcessorError) as context:
+            ImageBatch.from_files(["5.jpg", "non_existing_file.jpg"])
+        self.assertEqual(str(context.exception), "Could not load image from path: non_existing_file.jpg")
+
+    def test_resize(self):
+        self.assert_matches_processor(lambda p: p.resize(100, 80))
+
+    def test_resize_with_scale(self):
+        self.assert_matches_processor(lambda p: p.resize(scale=0.5))
+
+    def test_rotate(self):
+        self.assert_matches_processor(lambda p: p.rotate(angle=30, bg_color_rgb=(10, 20, 30)))
+
+    def test_rotate_small_frames(self):
+        # Below the remap limit, so the processor reuses the tables built for the batch
+        for _ in range(2):
+            self.setUp()
+            self.assert_matches_processor(lambda p: (p.resize(200, 150), p.rotate(angle=30)))
+
+    def test_rotate_fit(self):
+        self.assert_matches_processor(lambda p: p.rotate(angle=-45, resize_canvas=False))
+
+    def test_crop_is_a_view(self):
+        base = self.batch.images
+        self.batch.crop(x1=10, y1=20, width=50, height=40)
+        self.assertTrue(np.shares_memory(self.batch.images, base))
+        self.assertEqual(self.batch.images.shape[1:3], (40, 50))
+
+    def test_crop_then_resize(self):
+        self.assert_matches_processor(lambda p: (p.crop(x1=10, y1=20, x2=300, y2=200), p.resize(scale=0.5)))
+
+    def test_draw_circle(self):
+        self.assert_matches_processor(lambda p: p.draw_circle((300, 300), 100, (255, 255, 0), 5))
+
+    def test_draw_rectangle(self):
+        self.assert_matches_processor(lambda p: p.draw_rectangle((50, 50), (200, 200), (0, 255, 255), -1))
+
+    def test_annotate(self):
+        self.assert_matches_processor(lambda p: p.annotate("Hello World!", (50, 300), 2, (255, 0, 255), 3))
+
+    def test_drawing_after_crop(self):
+        self.assert_matches_processor(lambda p: (p.crop(x1=100, y1=100, width=400, height=300), p.draw_circle((50, 50), 20)))
+
+    def test_drawing_on_rgba_images(self):
+        images = np.full((2, 60, 80, 4), 200, dtype=np.uint8)
+        batch = ImageBatch(images.copy())
+        batch.draw_rectangle((10, 10), (30, 40), (0, 255, 255), -1)
+        batch.draw_circle((50, 30), 10, (255, 0, 0))
+        batch.annotate("A", (45, 58), 1, (255, 0, 255), 1)
+        expected = images[0].copy()
+        # OpenCV pads a three value colour with 0, so the alpha channel becomes 0
+        cv2.rectangle(expected, (10, 10), (30, 40), (0, 255, 255), -1)
+        np.testing.assert_array_equal(batch[1][10:41, 10:31], expected[10:41, 10:31])
+        np.testing.assert_array_equal(batch[0], batch[1])
+
+    def test_elementwise_operations(self):
+        original = self.batch.images.copy()
+        self.batch.invert()
+        np.testing.assert_array_equal(self.batch.images, 255 - original)
+        self.batch.invert()
+        self.batch.convert_scale(alpha=2.0, beta=10)
+        np.testing.assert_array_equal(self.batch.images, cv2.convertScaleAbs(original, alpha=2.0, beta=10))
+        grey = ImageBatch(original).to_grayscale()
+        for i in range(len(original)):
+            np.testing.assert_array_equal(grey[i], cv2.cvtColor(original[i], cv2.COLOR_RGB2GRAY))
+
+    def test_from_video(self):
+        frames = np.random.default_rng(0).integers(0, 255, size=(6, 48, 64, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "video.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+            for frame in frames:
+                writer.write(frame)
+            writer.release()
+            batch = ImageBatch.from_video(path, start=1, stop=6, step=2)
+            all_frames = ImageBatch.from_video(path)
+        self.assertEqual(batch.images.shape, (3, 48, 64, 3))
+        self.assertEqual(len(all_frames), 6)
+        np.testing.assert_array_equal(batch[1], all_frames[3])
+
+    def test_to_bytes(self):
+        encoded = self.batch.to_bytes("jpeg", quality=80)
+        self.assertEqual(len(encoded), 3)
+        self.assertEqual(bytes(encoded[0]), bytes(ImageProcessor("5.jpg").to_bytes("jpeg", quality=80)))
+
+    def test_invalid_images(self):
+        with self.assertRaises(ImageProcessorError) as context:
+            ImageBatch(np.zeros((10, 10)))
+        self.assertEqual(str(context.exception), "images must be a numpy array of shape (N, H, W, C) or (N, H, W).")
+
+
+if __name__ == "__main__":
+    unittest.main()
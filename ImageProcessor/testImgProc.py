@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from ImgProc import ImageProcessor, ImageProcessorError
 
@@ -80,5 +82,32 @@ class TestImageProcessing(unittest.TestCase):
     def test_rotate_image(self):
         pass
 
+    def test_save_image(self):
+        imageProcessor = ImageProcessor("5.jpg")
+        imageProcessor.resize(100, 50)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "saved.png")
+            imageProcessor.save(path)
+            saved = ImageProcessor(path)
+        self.assertTrue((saved.image == imageProcessor.image).all())
+
+    def test_save_image_with_unknown_extension(self):
+        imageProcessor = ImageProcessor("5.jpg")
+        with self.assertRaises(ImageProcessorError) as context:
+            imageProcessor.save("saved.unknown")
+        self.assertEqual(str(context.exception), "Could not save image to path: saved.unknown")
+
+    def test_to_bytes(self):
+        imageProcessor = ImageProcessor("5.jpg")
+        data = imageProcessor.to_bytes("png", compression=9)
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(bytes(data[:8]), b"\x89PNG\r\n\x1a\n")
+
+    def test_to_bytes_with_invalid_option(self):
+        imageProcessor = ImageProcessor("5.jpg")
+        with self.assertRaises(ImageProcessorError) as context:
+            imageProcessor.to_bytes("png", quality=80)
+        self.assertEqual(str(context.exception), "quality is not supported for format: png")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,89 @@
+import time
+import unittest
+import urllib.request
+from instrumentation import InstrumentationError, Metrics, SamplingProfiler, metrics
+from ImgProc import ImageProcessor
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_disabled_records_nothing(self):
+        registry = Metrics(enabled=False)
+        with registry.stage("read"):
+            pass
+        registry.increment("frames_dropped")
+        registry.set_gauge("queue", 3)
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["stages"], {})
+        self.assertEqual(snapshot["counters"], {})
+        self.assertEqual(snapshot["gauges"], {})
+
+    def test_stage_histogram(self):
+        registry = Metrics(enabled=True, buckets=(0.001, 1.0))
+        with registry.stage("read"):
+            time.sleep(0.002)
+        registry.observe("read", 0.0005)
+        histogram = registry.histogram("read").snapshot()
+        self.assertEqual(histogram["count"], 2)
+        self.assertEqual(histogram["counts"], [1, 1, 0])
+        self.assertGreaterEqual(histogram["max"], 0.002)
+
+    def test_prometheus_text(self):
+        registry = Metrics(enabled=True, buckets=(0.01,))
+        registry.observe("video.read", 0.005)
+        registry.increment("frames_dropped", 2)
+        registry.set_gauge("queue", 4)
+        text = registry.to_prometheus()
+        self.assertIn('cv_stage_seconds_bucket{stage="video.read",le="0.01"} 1', text)
+        self.assertIn('cv_stage_seconds_bucket{stage="video.read",le="+Inf"} 1', text)
+        self.assertIn('cv_events_total{event="frames_dropped"} 2', text)
+        self.assertIn('cv_gauge{name="queue"} 4', text)
+
+    def test_http_endpoint(self):
+        registry = Metrics(enabled=True)
+        registry.increment("frames_read")
+        port = registry.start_http_server(0)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+                body = response.read().decode("utf-8")
+        finally:
+            registry.stop_http_server()
+        self.assertIn('cv_events_total{event="frames_read"} 1', body)
+
+    def test_json_logger(self):
+        registry = Metrics(enabled=True)
+        registry.increment("frames_read")
+        lines = []
+        registry.start_json_logger(interval=0.01, write=lines.append)
+        time.sleep(0.1)
+        registry.stop_json_logger()
+        self.assertGreater(len(lines), 0)
+        self.assertIn('"frames_read": 1', lines[0])
+
+    def test_profiler(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        end = time.perf_counter() + 0.1
+        while time.perf_counter() < end:
+            pass
+        profiler.stop()
+        self.assertFalse(profiler.running)
+        self.assertTrue(any("test_profiler" in stack for stack in profiler.stacks))
+        with self.assertRaises(InstrumentationError):
+            SamplingProfiler(interval=0)
+
+    def test_image_processor_is_timed(self):
+        metrics.reset()
+        metrics.enable()
+        try:
+            processor = ImageProcessor("5.jpg")
+            processor.resize(scale=0.5)
+        finally:
+            metrics.disable()
+        self.assertEqual(metrics.histogram("imgproc.load").count, 1)
+        self.assertEqual(metrics.histogram("imgproc.resize").count, 1)
+        metrics.reset()
+
+
+if __name__ == "__main__":
+    unittest.main()
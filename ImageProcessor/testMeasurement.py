@@ -0,0 +1,73 @@
+import csv
+import os
+import tempfile
+import unittest
+import numpy as np
+import cv2
+from measurement import MeasurementError, RESULT_COLUMNS, STATUS_COLUMNS, filter_objects, measure_directory, measure_mask, segment_objects
+
+
+def synthetic_image():
+    # Three dark "screws" on a bright background
+    image = np.full((200, 300), 220, dtype=np.uint8)
+    cv2.rectangle(image, (10, 20), (59, 39), 30, -1)
+    cv2.rectangle(image, (100, 100), (119, 179), 30, -1)
+    cv2.rectangle(image, (200, 50), (203, 53), 30, -1)
+    return image
+
+
+class TestMeasurement(unittest.TestCase):
+
+    def test_measure_mask(self):
+        mask = segment_objects(synthetic_image(), blur_ksize=0, close_ksize=0)
+        m = measure_mask(mask)
+        order = np.argsort(m["boxes"][:, 0])
+        np.testing.assert_array_equal(
+            m["boxes"][order],
+            [[10, 20, 60, 40], [100, 100, 120, 180], [200, 50, 204, 54]]
+        )
+        np.testing.assert_array_equal(m["areas"][order], [1000, 1600, 16])
+        np.testing.assert_allclose(m["centroids"][order][0], (34.5, 29.5))
+
+    def test_filter_objects(self):
+        m = measure_mask(segment_objects(synthetic_image(), blur_ksize=0, close_ksize=0))
+        self.assertEqual(len(filter_objects(m, min_area=100)["areas"]), 2)
+        self.assertEqual(len(filter_objects(m, min_aspect=2.0)["areas"]), 1)
+        kept = filter_objects(m, predicate=lambda obj: obj["centroids"][:, 1] > 60)
+        np.testing.assert_array_equal(kept["boxes"], [[100, 100, 120, 180]])
+
+    def test_invalid_mask(self):
+        with self.assertRaises(MeasurementError) as context:
+            measure_mask(np.zeros((3, 3, 3), np.uint8))
+        self.assertEqual(str(context.exception), "mask must be a 2D numpy array.")
+
+    def test_measure_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for i in range(3):
+                cv2.imwrite(os.path.join(directory, f"frame_{i}.png"), synthetic_image())
+            cv2.imwrite(os.path.join(directory, "empty.png"), np.full((50, 60), 255, dtype=np.uint8))
+            with open(os.path.join(directory, "broken.png"), "w") as f:
+                f.write("This is not an image")
+            output_path = os.path.join(directory, "results.csv")
+            errors = measure_directory(directory, output_path, pattern="*.png", workers=2, filters={"min_area": 100})
+            with open(output_path, newline="") as f:
+                rows = list(csv.reader(f))
+            with open(os.path.join(directory, "results_images.csv"), newline="") as f:
+                status = list(csv.reader(f))
+            with self.assertRaises(MeasurementError) as context:
+                measure_directory(directory, output_path, pattern="*.png", filters={"min_aera": 100})
+        self.assertEqual(str(context.exception), "Unknown filters: min_aera")
+        self.assertEqual(tuple(rows[0]), RESULT_COLUMNS)
+        self.assertEqual(len(rows) - 1, 6)
+        self.assertEqual(list(errors), ["broken.png"])
+        # One row per image, also for images without objects
+        self.assertEqual(tuple(status[0]), STATUS_COLUMNS)
+        by_image = {row[0]: row[1:] for row in status[1:]}
+        self.assertEqual(by_image["empty.png"], ["0", ""])
+        self.assertEqual(by_image["frame_0.png"], ["2", ""])
+        self.assertEqual(by_image["broken.png"][0], "")
+        self.assertEqual(by_image["broken.png"][1], errors["broken.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import cv2
+from detection import compute_hog_features
+from mining import MiningError, PatchStore, mine_hard_negatives, scan_image, train_with_hard_negatives
+from training import LinearDetector
+
+
+def patches(n, value=0):
+    return np.full((n, 62, 47), value, dtype=np.uint8)
+
+
+def accept_all_detector():
+    # Scores every window with 1.0, so every window counts as a detection
+    features = compute_hog_features(patches(1))
+    return LinearDetector(np.zeros(features.shape[1]), 1.0)
+
+
+class TestPatchStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "hard_negatives.u8")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_add_and_reopen(self):
+        store = PatchStore(self.path)
+        boxes = [[0, 0, 47, 62], [100, 100, 47, 62]]
+        self.assertEqual(store.add(np.stack([patches(1, 1)[0], patches(1, 2)[0]]), boxes, [0.5, 0.9], "a.jpg"), 2)
+        self.assertEqual(os.path.getsize(self.path), 2 * 62 * 47)
+        reopened = PatchStore(self.path)
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(reopened.patches.shape, (2, 62, 47))
+        # Highest score first
+        self.assertEqual(set(np.unique(reopened.patches)), {1, 2})
+        self.assertEqual(reopened.patches[0, 0, 0], 2)
+        np.testing.assert_array_equal(reopened.features, compute_hog_features(reopened.patches))
+
+    def test_duplicates_are_dropped(self):
+        store = PatchStore(self.path)
+        store.add(patches(1), [[10, 10, 47, 62]], [1.0], "a.jpg")
+        # Overlaps the stored box of the same image
+        self.assertEqual(store.add(patches(1), [[12, 11, 47, 62]], [2.0], "a.jpg"), 0)
+        # Same box in another image is new
+        self.assertEqual(store.add(patches(1), [[12, 11, 47, 62]], [2.0], "b.jpg"), 1)
+        # Overlapping boxes within one call keep the higher score
+        self.assertEqual(store.add(patches(2), [[200, 0, 47, 62], [201, 0, 47, 62]], [0.1, 0.3], "a.jpg"), 1)
+        np.testing.assert_allclose(sorted(store.scores), [0.3, 1.0, 2.0])
+
+    def test_bounded_store_replaces_weakest(self):
+        store = PatchStore(self.path, max_patches=2)
+        store.add(np.stack([patches(1, 1)[0], patches(1, 2)[0]]), [[0, 0, 47, 62], [100, 0, 47, 62]], [0.5, 0.9], "a.jpg")
+        self.assertEqual(store.add(patches(1, 3), [[300, 0, 47, 62]], [0.1], "a.jpg"), 0)
+        self.assertEqual(store.add(patches(1, 4), [[300, 0, 47, 62]], [0.7], "a.jpg"), 1)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(os.path.getsize(self.path), 2 * 62 * 47)
+        self.assertEqual(sorted(store.patches[:, 0, 0].tolist()), [2, 4])
+        # The replaced slot got the features of the new patch
+        np.testing.assert_array_equal(store.features, compute_hog_features(store.patches))
+
+    def test_reopen_with_smaller_max_patches(self):
+        PatchStore(self.path).add(np.stack([patches(1, 1)[0], patches(1, 2)[0]]), [[0, 0, 47, 62], [100, 0, 47, 62]], [0.5, 0.9], "a.jpg")
+        with self.assertRaises(MiningError):
+            PatchStore(self.path, max_patches=1)
+        # A full store only replaces, it never grows
+        store = PatchStore(self.path, max_patches=2)
+        self.assertEqual(store.add(patches(1, 3), [[300, 0, 47, 62]], [1.0], "a.jpg"), 1)
+        self.assertEqual(len(store), 2)
+
+    def test_other_hog_parameters(self):
+        PatchStore(self.path).add(patches(1), [[0, 0, 47, 62]], [1.0], "a.jpg")
+        with self.assertRaises(MiningError):
+            PatchStore(self.path, pixels_per_cell=(4, 4))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(MiningError) as context:
+            PatchStore(self.path, max_patches=0)
+        self.assertEqual(str(context.exception), "max_patches must be a positive integer.")
+        with self.assertRaises(MiningError) as context:
+            PatchStore(self.path).add(patches(2), [[0, 0, 47, 62]], [1.0, 2.0], "a.jpg")
+        self.assertEqual(str(context.exception), "patches, boxes and scores must have the same length.")
+
+
+class TestMining(unittest.TestCase):
+
+    def test_scan_image(self):
+        image = np.random.default_rng(0).integers(0, 255, size=(100, 120), dtype=np.uint8)
+        (found, boxes, scores) = scan_image(image, accept_all_detector(), scales=(1.0, 0.5), step=20)
+        # 2x4 windows at full size, none at half size (50x60 is too small for a 47x62 window)
+        self.assertEqual(len(found), 2 * 4)
+        np.testing.assert_array_equal(boxes[1], [20, 0, 47, 62])
+        np.testing.assert_array_equal(found[1], image[0:62, 20:67])
+        self.assertTrue((scores == 1.0).all())
+
+    def test_mine_and_retrain(self):
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, "background.png")
+            cv2.imwrite(image_path, rng.integers(0, 255, size=(120, 160), dtype=np.uint8))
+            store = PatchStore(os.path.join(directory, "hard_negatives.u8"), max_patches=50)
+            (added, errors) = mine_hard_negatives(
+                [image_path, os.path.join(directory, "missing.png")], accept_all_detector(), store, scales=(1.0,), step=16, workers=2
+            )
+            self.assertGreater(added, 0)
+            self.assertEqual(len(store), added)
+            self.assertEqual(list(errors), [os.path.join(directory, "missing.png")])
+
+            # Faces: bright oval on dark background, non-faces: smooth gradients
+            faces = np.zeros((20, 62, 47), dtype=np.uint8)
+            for face in faces:
+                cv2.ellipse(face, (23, 31), (15, 22), 0, 0, 360, int(rng.integers(150, 255)), -1)
+            gradients = np.stack([np.tile(np.linspace(0, v, 47, dtype=np.uint8), (62, 1)) for v in range(10, 210, 10)])
+            (detector, history) = train_with_hard_negatives(
+                compute_hog_features(faces), compute_hog_features(gradients), [image_path], store,
+                rounds=2, scales=(1.0,), step=16, workers=2
+            )
+        self.assertIsInstance(detector, LinearDetector)
+        self.assertGreaterEqual(len(history), 1)
+        self.assertEqual(history[0]["round"], 1)
+        self.assertTrue((detector.predict(compute_hog_features(faces)) == 1).all())
+
+    def test_retrain_with_other_hog_parameters(self):
+        rng = np.random.default_rng(0)
+        hog_options = {"pixels_per_cell": (16, 16), "cells_per_block": (1, 1)}
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, "background.png")
+            cv2.imwrite(image_path, rng.integers(0, 255, size=(120, 160), dtype=np.uint8))
+            store = PatchStore(os.path.join(directory, "hard_negatives.u8"), max_patches=50, **hog_options)
+            faces = rng.integers(150, 255, size=(10, 62, 47), dtype=np.uint8)
+            backgrounds = rng.integers(0, 100, size=(10, 62, 47), dtype=np.uint8)
+            (detector, history) = train_with_hard_negatives(
+                compute_hog_features(faces, **hog_options), compute_hog_features(backgrounds, **hog_options), [image_path], store,
+                rounds=2, scales=(1.0,), step=16, workers=1
+            )
+        self.assertEqual(detector.pixels_per_cell, (16, 16))
+        self.assertEqual(detector.cells_per_block, (1, 1))
+        self.assertNotIn(image_path, history[-1]["errors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
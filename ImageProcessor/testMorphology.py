@@ -0,0 +1,110 @@
+import unittest
+import numpy as np
+import cv2
+from morphology import (
+    MorphologyError,
+    dilate,
+    erode,
+    dilate_binary,
+    erode_binary,
+    fuse_iterations,
+    kernel_shape,
+    morphology_bundle,
+)
+
+
+def random_mask(height=61, width=83, seed=0):
+    # Odd sizes so the packed rows end with padding bits
+    rng = np.random.default_rng(seed)
+    mask = (rng.random((height, width)) > 0.8).astype(np.uint8) * 255
+    return mask
+
+
+class TestMorphology(unittest.TestCase):
+
+    def test_kernel_shape(self):
+        self.assertEqual(kernel_shape(np.ones((3, 3), np.uint8)), "rect")
+        self.assertEqual(kernel_shape(cv2.getStructuringElement(cv2.MORPH_CROSS, (5, 5))), "cross")
+        self.assertEqual(kernel_shape(cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))), "general")
+
+    def test_fuse_iterations_rect(self):
+        fused, anchor = fuse_iterations(np.ones((3, 3), np.uint8), 10)
+        self.assertEqual(fused.shape, (21, 21))
+        self.assertEqual(anchor, (10, 10))
+
+    def test_dilate_matches_opencv(self):
+        mask = random_mask()
+        for kernel in (
+            np.ones((3, 3), np.uint8),
+            np.ones((2, 5), np.uint8),
+            cv2.getStructuringElement(cv2.MORPH_CROSS, (5, 5)),
+            cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5)),
+            # Sparse kernel, its fused form has fewer elements than all iterations together
+            np.array([[1, 0, 1]], np.uint8),
+        ):
+            for iterations in (1, 3):
+                expected = cv2.dilate(mask, kernel, iterations=iterations)
+                np.testing.assert_array_equal(dilate(mask, kernel, iterations), expected)
+
+    def test_erode_matches_opencv(self):
+        mask = random_mask(seed=1)
+        mask = cv2.dilate(mask, np.ones((3, 3), np.uint8))
+        for kernel in (
+            np.ones((3, 3), np.uint8),
+            cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3)),
+            cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5)),
+        ):
+            for iterations in (1, 2):
+                expected = cv2.erode(mask, kernel, iterations=iterations)
+                np.testing.assert_array_equal(erode(mask, kernel, iterations), expected)
+
+    def test_binary_matches_opencv(self):
+        mask = random_mask(seed=2)
+        # Short kernels go to OpenCV, (17, 1) x 10 and (71, 3) use the bit packed path
+        for ksize in ((3, 3), (5, 2), (1, 7), (17, 1), (71, 3)):
+            kernel = np.ones((ksize[1], ksize[0]), np.uint8)
+            for iterations in (1, 10):
+                np.testing.assert_array_equal(
+                    dilate_binary(mask, ksize, iterations),
+                    cv2.dilate(mask, kernel, iterations=iterations)
+                )
+                np.testing.assert_array_equal(
+                    erode_binary(mask, ksize, iterations),
+                    cv2.erode(mask, kernel, iterations=iterations)
+                )
+
+    def test_bundle_matches_morphologyEx(self):
+        mask = random_mask(seed=3)
+        # The long kernel takes the bit packed path
+        for kernel in (np.ones((3, 3), np.uint8), np.ones((3, 65), np.uint8)):
+            self.assert_bundle_matches(mask, kernel)
+
+    def assert_bundle_matches(self, mask, kernel):
+        expected = {
+            "open": cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel),
+            "close": cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel),
+            "gradient": cv2.morphologyEx(mask, cv2.MORPH_GRADIENT, kernel),
+            "tophat": cv2.morphologyEx(mask, cv2.MORPH_TOPHAT, kernel),
+            "blackhat": cv2.morphologyEx(mask, cv2.MORPH_BLACKHAT, kernel),
+        }
+        for binary in (False, True):
+            results = morphology_bundle(mask, kernel, tuple(expected), binary=binary)
+            self.assertEqual(list(results), list(expected))
+            for name in expected:
+                np.testing.assert_array_equal(results[name], expected[name])
+
+    def test_invalid_arguments(self):
+        mask = random_mask()
+        with self.assertRaises(MorphologyError) as context:
+            dilate(mask, np.zeros((3, 3), np.uint8))
+        self.assertEqual(str(context.exception), "kernel must contain at least one non-zero element.")
+        with self.assertRaises(MorphologyError) as context:
+            erode(mask, np.ones((3, 3), np.uint8), iterations=0)
+        self.assertEqual(str(context.exception), "iterations must be a positive integer.")
+        with self.assertRaises(MorphologyError) as context:
+            morphology_bundle(mask, np.ones((3, 3), np.uint8), ("sharpen",))
+        self.assertEqual(str(context.exception), "Unknown operation: sharpen")
+
+
+if __name__ == "__main__":
+    unittest.main()
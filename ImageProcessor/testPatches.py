@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from patches import PatchDataset, PatchDatasetError, augment_patches
+
+
+class TestPatchDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.positive = rng.integers(0, 255, size=(10, 62 * 47), dtype=np.uint8)
+        self.negative = rng.integers(0, 255, size=(25, 62 * 47), dtype=np.uint8)
+        self.positive_path = os.path.join(self.directory.name, "positive_patches.npy")
+        self.negative_path = os.path.join(self.directory.name, "negative_patches.npy")
+        np.save(self.positive_path, self.positive)
+        np.save(self.negative_path, self.negative)
+        self.dataset = PatchDataset.open(self.positive_path, self.negative_path)
+
+    def tearDown(self):
+        self.dataset = None
+        self.directory.cleanup()
+
+    def test_views_are_memory_mapped(self):
+        positives = self.dataset.positives
+        self.assertEqual(positives.shape, (10, 62, 47))
+        self.assertIsInstance(positives.base, np.memmap)
+        np.testing.assert_array_equal(positives[3], self.positive[3].reshape(62, 47))
+        self.assertEqual(len(self.dataset), 35)
+        self.assertEqual(self.dataset.labels.sum(), 10)
+
+    def test_gather(self):
+        (patches, labels) = self.dataset.gather([12, 2, 34])
+        np.testing.assert_array_equal(labels, [0, 1, 0])
+        np.testing.assert_array_equal(patches[0], self.negative[2].reshape(62, 47))
+        np.testing.assert_array_equal(patches[1], self.positive[2].reshape(62, 47))
+        np.testing.assert_array_equal(patches[2], self.negative[24].reshape(62, 47))
+
+    def test_batches_cover_dataset_once(self):
+        batches = list(self.dataset.batches(8, seed=1))
+        self.assertEqual([len(labels) for _, labels in batches], [8, 8, 8, 8, 3])
+        seen = np.concatenate([patches.reshape(len(patches), -1) for patches, _ in batches])
+        expected = np.vstack((self.positive, self.negative))
+        # Every patch exactly once, in shuffled order
+        self.assertEqual(sorted(map(bytes, seen)), sorted(map(bytes, expected)))
+        self.assertFalse(np.array_equal(seen, expected))
+        self.assertEqual(sum(labels.sum() for _, labels in batches), 10)
+
+    def test_batches_are_reproducible(self):
+        first = [labels for _, labels in self.dataset.batches(8, seed=3, augment=True)]
+        second = [labels for _, labels in self.dataset.batches(8, seed=3, augment=True)]
+        np.testing.assert_array_equal(np.concatenate(first), np.concatenate(second))
+
+    def test_drop_last_and_unshuffled(self):
+        batches = list(self.dataset.batches(8, shuffle=False, drop_last=True))
+        self.assertEqual(len(batches), 4)
+        np.testing.assert_array_equal(batches[0][0][0], self.positive[0].reshape(62, 47))
+
+    def test_stop_early(self):
+        for (i, _) in enumerate(self.dataset.batches(2, prefetch=1)):
+            if i == 1:
+                break
+        self.assertEqual(i, 1)
+
+    def test_add_extra_negatives(self):
+        self.dataset.add(np.zeros((5, 62, 47), dtype=np.uint8), 0)
+        self.assertEqual(len(self.dataset), 40)
+        self.assertEqual(self.dataset.negatives.shape, (30, 62, 47))
+        with self.assertRaises(PatchDatasetError) as context:
+            self.dataset.add(np.zeros((5, 10)), 0)
+        self.assertEqual(str(context.exception), "patches must have shape (N, 2914) or (N, 62, 47).")
+
+    def test_floating_point_patches(self):
+        # LFW-style patch files are float32
+        positive = np.random.default_rng(1).random((4, 62 * 47), dtype=np.float32)
+        path = os.path.join(self.directory.name, "positive_float.npy")
+        np.save(path, positive)
+        dataset = PatchDataset.open(path, self.negative_path)
+        self.assertEqual(dataset.dtype, np.float32)
+        (patches, labels) = dataset.gather([0, 4])
+        self.assertEqual(patches.dtype, np.float32)
+        np.testing.assert_array_equal(patches[0], positive[0].reshape(62, 47))
+        np.testing.assert_array_equal(patches[1], self.negative[0].reshape(62, 47))
+        for (batch, _) in dataset.batches(8, augment=True, seed=0):
+            self.assertEqual(batch.dtype, np.float32)
+            self.assertTrue(batch.any())
+        with self.assertRaises(PatchDatasetError) as context:
+            dataset.add(np.zeros((2, 62, 47), dtype=np.int64), 0)
+        self.assertEqual(str(context.exception), "patches must be uint8 or floating point, not: int64")
+
+    def test_missing_file(self):
+        with self.assertRaises(PatchDatasetError) as context:
+            PatchDataset.open("missing.npy", self.negative_path)
+        self.assertEqual(str(context.exception), "Could not load patches from path: missing.npy")
+
+
+class TestAugmentation(unittest.TestCase):
+
+    def test_augment_patches(self):
+        rng = np.random.default_rng(0)
+        patches = np.tile(np.arange(47, dtype=np.uint8) * 5, (16, 62, 1))
+        flipped = augment_patches(patches, rng, flip=True, max_shift=0, brightness=0)
+        rows = flipped[:, 0]
+        self.assertTrue(all(np.array_equal(row, patches[0, 0]) or np.array_equal(row, patches[0, 0, ::-1]) for row in rows))
+        self.assertTrue(any(np.array_equal(row, patches[0, 0, ::-1]) for row in rows))
+
+        shifted = augment_patches(patches, rng, flip=False, max_shift=2, brightness=0)
+        self.assertEqual(shifted.shape, patches.shape)
+        self.assertTrue(np.abs(shifted.astype(int) - patches).max() <= 10)
+
+        brighter = augment_patches(patches, rng, flip=False, max_shift=0, brightness=0.5)
+        self.assertEqual(brighter.dtype, np.uint8)
+        self.assertFalse(np.array_equal(brighter, patches))
+        # The input is never modified
+        np.testing.assert_array_equal(patches[0, 0], np.arange(47) * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.svm import LinearSVC
+from detection import compute_hog_features
+from training import (
+    LinearDetector, TrainingError, compute_hog_features_parallel, export_model, load_model,
+    load_patch_features, measure_throughput, select_model, sweep
+)
+
+
+def synthetic_features(n=200, seed=0):
+    # Two shifted clouds, like HOG features of faces and non-faces
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0, 1, size=(n, 20)).astype(np.float32)
+    y = (np.arange(n) % 2).astype(np.int64)
+    X[y == 1, :5] += 2.0
+    return X, y
+
+
+class TestTraining(unittest.TestCase):
+
+    def test_sweep(self):
+        (X, y) = synthetic_features()
+        grid = [
+            ("linear_svc", LinearSVC(C=0.1)),
+            ("random_forest", RandomForestClassifier(n_estimators=10, n_jobs=1, random_state=0)),
+        ]
+        results = sweep(X[:150], y[:150], X[150:], y[150:], grid, workers=2, repeat=1)
+        self.assertEqual(sorted(result["name"] for result in results), ["linear_svc", "random_forest"])
+        self.assertGreaterEqual(results[0]["windows_per_s"], results[1]["windows_per_s"])
+        for result in results:
+            self.assertGreater(result["recall"], 0.8)
+            self.assertGreater(result["precision"], 0.8)
+
+    def test_select_model(self):
+        results = [
+            {"name": "slow", "recall": 0.99, "precision": 0.9, "windows_per_s": 1000.0},
+            {"name": "fast", "recall": 0.96, "precision": 0.8, "windows_per_s": 50000.0},
+            {"name": "fastest", "recall": 0.90, "precision": 0.95, "windows_per_s": 90000.0},
+        ]
+        self.assertEqual(select_model(results, 0.95)["name"], "fast")
+        self.assertEqual(select_model(results, 0.98)["name"], "slow")
+        with self.assertRaises(TrainingError) as context:
+            select_model(results, 0.999)
+        self.assertEqual(str(context.exception), "No model reaches a recall of 0.999, the best recall is 0.990.")
+
+    def test_export_linear_model(self):
+        (X, y) = synthetic_features()
+        model = LinearSVC(C=0.1).fit(X, y)
+        with tempfile.TemporaryDirectory() as directory:
+            path = export_model(model, os.path.join(directory, "detector"))
+            self.assertTrue(path.endswith(".npz"))
+            detector = load_model(path)
+        self.assertIsInstance(detector, LinearDetector)
+        np.testing.assert_allclose(detector.decision_function(X), model.decision_function(X), rtol=1e-4, atol=1e-4)
+        np.testing.assert_array_equal(detector.predict(X), model.predict(X))
+        self.assertGreater(measure_throughput(detector, X, batch_size=64, repeat=1), 0)
+
+    def test_export_other_model(self):
+        (X, y) = synthetic_features()
+        model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+        with tempfile.TemporaryDirectory() as directory:
+            path = export_model(model, os.path.join(directory, "detector.npz"))
+            self.assertTrue(path.endswith(".pkl"))
+            np.testing.assert_array_equal(load_model(path).predict(X), model.predict(X))
+
+    def test_linear_detector_requires_linear_model(self):
+        (X, y) = synthetic_features()
+        with self.assertRaises(TrainingError) as context:
+            LinearDetector.from_estimator(RandomForestClassifier(n_estimators=2).fit(X, y))
+        self.assertEqual(str(context.exception), "estimator must be a fitted linear binary classifier.")
+
+    def test_parallel_hog_features(self):
+        patches = np.random.default_rng(0).integers(0, 255, size=(7, 62, 47), dtype=np.uint8)
+        np.testing.assert_allclose(compute_hog_features_parallel(patches, workers=2, chunk_size=3), compute_hog_features(patches))
+
+    def test_load_patch_features_caches(self):
+        patches = np.random.default_rng(0).integers(0, 255, size=(4, 62 * 47), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "positive_patches.npy")
+            np.save(path, patches)
+            features = load_patch_features(path)
+            cached = os.listdir(os.path.join(directory, "hog_cache"))
+            self.assertEqual(len(cached), 1)
+            np.testing.assert_allclose(load_patch_features(path), features)
+            np.testing.assert_allclose(features, compute_hog_features(patches.reshape(-1, 62, 47)))
+            # Other HOG parameters get their own cache entry
+            load_patch_features(path, pixels_per_cell=(16, 16))
+            self.assertEqual(len(os.listdir(os.path.join(directory, "hog_cache"))), 2)
+
+    def test_load_missing_patches(self):
+        with self.assertRaises(TrainingError) as context:
+            load_patch_features("missing_patches.npy")
+        self.assertEqual(str(context.exception), "Could not load patches from path: missing_patches.npy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import numpy as np
+import cv2
+from transforms import CANVAS_MODES, ENTRY_OVERHEAD, EXPAND, FIT, TransformCache, TransformError, build_maps, rotation_matrix
+
+
+class TestTransforms(unittest.TestCase):
+
+    def setUp(self):
+        # Noise, so any difference in the interpolation shows up
+        self.image = np.random.default_rng(0).integers(0, 256, size=(90, 120, 3), dtype=np.uint8)
+
+    def test_rotation_matrix_expand(self):
+        (M, size) = rotation_matrix(self.image.shape, 90)
+        self.assertEqual(size, (90, 120))
+        (M, size) = rotation_matrix(self.image.shape, 30)
+        self.assertEqual(size, (int(120 * np.cos(np.pi / 6) + 90 * 0.5), int(120 * 0.5 + 90 * np.cos(np.pi / 6))))
+        # The image center is moved to the center of the canvas
+        np.testing.assert_allclose(M @ [60, 45, 1], (size[0] / 2, size[1] / 2))
+
+    def test_rotation_matrix_fit_keeps_canvas(self):
+        M, size = rotation_matrix(self.image.shape, 45, canvas=FIT)
+        self.assertEqual(size, (120, 90))
+        corners = np.array([[0, 0, 1], [119, 0, 1], [0, 89, 1], [119, 89, 1]], dtype=np.float64)
+        moved = corners @ M.T
+        self.assertTrue((moved >= -1).all() and (moved[:, 0] <= 120).all() and (moved[:, 1] <= 90).all())
+
+    def test_remap_matches_warp_affine(self):
+        cache = TransformCache()
+        self.assertIsNone(cache.rotation(self.image.shape, 30, canvas=EXPAND).maps)
+        # The remap tables are built on the second use
+        transform = cache.rotation(self.image.shape, 30, canvas=EXPAND)
+        self.assertIsNotNone(transform.maps)
+        expected = cv2.warpAffine(self.image, transform.matrix, transform.size, borderValue=(1, 2, 3))
+        np.testing.assert_array_equal(transform.apply(self.image, (1, 2, 3)), expected)
+
+    def test_cached_rotations_do_not_change_the_pixels(self):
+        # The first use runs warpAffine, later uses run remap, the results must be identical
+        cache = TransformCache()
+        for angle in (30, -45, 17.5, 90, 123.4):
+            for canvas in CANVAS_MODES:
+                (M, size) = rotation_matrix(self.image.shape, angle, canvas=canvas)
+                expected = cv2.warpAffine(self.image, M, size, borderValue=(10, 20, 30))
+                for _ in range(3):
+                    result = cache.rotation(self.image.shape, angle, canvas=canvas).apply(self.image, (10, 20, 30))
+                    np.testing.assert_array_equal(result, expected)
+
+    def test_large_outputs_use_warp_affine(self):
+        cache = TransformCache(max_remap_pixels=100)
+        cache.rotation(self.image.shape, 30)
+        transform = cache.rotation(self.image.shape, 30)
+        self.assertIsNone(transform.maps)
+        np.testing.assert_array_equal(transform.apply(self.image), cv2.warpAffine(self.image, transform.matrix, transform.size))
+
+    def test_cache_hits(self):
+        cache = TransformCache(max_remap_pixels=0)
+        first = cache.rotation(self.image.shape, 10)
+        self.assertIs(cache.rotation(self.image.shape, 10.0), first)
+        self.assertIsNot(cache.rotation(self.image.shape, 10, canvas=FIT), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_eviction_within_budget(self):
+        cache = TransformCache(max_bytes=10**6)
+        for angle in (0, 180):
+            cache.rotation(self.image.shape, angle)
+            cache.rotation(self.image.shape, angle)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 2 * cache_entry_bytes(self.image.shape, 0))
+        cache = TransformCache(max_bytes=2 * cache_entry_bytes(self.image.shape, 0))
+        for angle in (0, 180, 360):
+            cache.rotation(self.image.shape, angle)
+            cache.rotation(self.image.shape, angle)
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        # 0 degrees was used least recently and has been evicted
+        cache.rotation(self.image.shape, 0)
+        self.assertEqual(cache.misses, 4)
+
+    def test_entries_without_tables_count_against_the_budget(self):
+        cache = TransformCache(max_remap_pixels=0, max_bytes=10 * ENTRY_OVERHEAD)
+        for angle in range(100):
+            cache.rotation((1080, 1920), angle / 10)
+        self.assertLessEqual(len(cache), 10)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        cache = TransformCache(max_remap_pixels=0, max_entries=5)
+        for angle in range(100):
+            cache.rotation((1080, 1920), angle / 10)
+        self.assertEqual(len(cache), 5)
+
+    def test_entries_above_budget_are_not_cached(self):
+        cache = TransformCache(max_bytes=1000)
+        transform = cache.rotation(self.image.shape, 10)
+        self.assertIsNone(cache.rotation(self.image.shape, 10).maps)
+        self.assertEqual(len(cache), 1)
+        self.assertLessEqual(cache.nbytes, 1000)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(TransformError) as context:
+            TransformCache().rotation(self.image.shape, 10, canvas="crop")
+        self.assertEqual(str(context.exception), "canvas must be one of ('expand', 'fit').")
+        with self.assertRaises(TransformError) as context:
+            TransformCache(max_bytes=-1)
+        self.assertEqual(str(context.exception), "max_bytes must be a non-negative integer.")
+
+
+def cache_entry_bytes(shape, angle):
+    M, size = rotation_matrix(shape, angle)
+    (map1, map2) = build_maps(M, size)
+    return ENTRY_OVERHEAD + M.nbytes + map1.nbytes + map2.nbytes
+
+
+if __name__ == "__main__":
+    unittest.main()
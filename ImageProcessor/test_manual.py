@@ -1,4 +1,3 @@
-import matplotlib.pyplot as plt
 from ImgProc import ImageProcessor, ImageProcessorError
 
 
@@ -20,6 +19,8 @@ def app():
     except ImageProcessorError as e:
         print(f"Error: {e}")
         return
+    # Imported late, so a failed run returns without loading matplotlib
+    import matplotlib.pyplot as plt
     plt.imshow(processor.image)
     plt.show()
 
@@ -0,0 +1,364 @@
+
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detection import PATCH_SIZE, compute_hog_features
+
+
+class TrainingError(Exception):
+    pass
+
+
+# Columns of the results table printed by main
+RESULT_COLUMNS = ("name", "precision", "recall", "windows_per_s", "fit_s")
+
+
+class LinearDetector:
+    """
+    A linear classifier reduced to its weight vector: score = features @ weights + bias.
+    Scoring a batch of windows is one matrix-vector product.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, pixels_per_cell: tuple[int, int] = (8, 8), cells_per_block: tuple[int, int] = (2, 2)):
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32).ravel()
+        self.bias = float(bias)
+        # HOG parameters the weights were trained with
+        self.pixels_per_cell = tuple(pixels_per_cell)
+        self.cells_per_block = tuple(cells_per_block)
+
+    @classmethod
+    def from_estimator(cls, estimator, pixels_per_cell: tuple[int, int] = (8, 8), cells_per_block: tuple[int, int] = (2, 2)) -> "LinearDetector":
+        """
+        Extract the weights of a fitted linear scikit-learn classifier (LinearSVC, SVC(kernel="linear"), LogisticRegression).
+        """
+        coef = getattr(estimator, "coef_", None)
+        if coef is None or np.asarray(coef).shape[0] != 1:
+            raise TrainingError("estimator must be a fitted linear binary classifier.")
+        # SVC stores coef_ as a sparse matrix if it was trained on sparse data
+        coef = coef.toarray() if hasattr(coef, "toarray") else np.asarray(coef)
+        return cls(coef[0], float(np.ravel(estimator.intercept_)[0]), pixels_per_cell, cells_per_block)
+
+    def decision_function(self, features: np.ndarray) -> np.ndarray:
+        return np.asarray(features, dtype=np.float32) @ self.weights + self.bias
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return (self.decision_function(features) > 0).astype(np.int64)
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            pixels_per_cell=self.pixels_per_cell,
+            cells_per_block=self.cells_per_block
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LinearDetector":
+        with np.load(path) as data:
+            return cls(
+                data["weights"],
+                float(data["bias"]),
+                tuple(int(v) for v in data["pixels_per_cell"]),
+                tuple(int(v) for v in data["cells_per_block"])
+            )
+
+
+def default_grid() -> list[tuple[str, object]]:
+    """
+    The models of the face detection exercise, each with a few hyperparameters.
+
+    Returns:
+        list[tuple[str, object]]: (name, unfitted estimator) pairs
+    """
+    # scikit-learn is slow to import, so only load it when models are trained
+    from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import SVC, LinearSVC
+    from sklearn.tree import DecisionTreeClassifier
+
+    grid = []
+    for C in (0.01, 0.1, 1.0):
+        grid.append((f"linear_svc C={C}", LinearSVC(C=C, class_weight="balanced")))
+        grid.append((f"logistic C={C}", LogisticRegression(C=C, class_weight="balanced", max_iter=1000)))
+    grid.append(("svc_linear", SVC(kernel="linear", class_weight="balanced")))
+    for C in (1.0, 10.0):
+        grid.append((f"svc_rbf C={C}", SVC(kernel="rbf", C=C, class_weight="balanced")))
+    for n in (50, 200):
+        grid.append((f"adaboost n={n}", AdaBoostClassifier(estimator=DecisionTreeClassifier(max_depth=1), n_estimators=n, random_state=42)))
+    # n_jobs=1, the sweep already runs one model per core
+    for n in (50, 100):
+        grid.append((f"random_forest n={n}", RandomForestClassifier(n_estimators=n, max_features="sqrt", class_weight="balanced", n_jobs=1, random_state=42)))
+    return grid
+
+
+def _hog_chunk(args):
+    (images, pixels_per_cell, cells_per_block) = args
+    return compute_hog_features(images, pixels_per_cell, cells_per_block)
+
+
+def compute_hog_features_parallel(
+    images: np.ndarray,
+    pixels_per_cell: tuple[int, int] = (8, 8),
+    cells_per_block: tuple[int, int] = (2, 2),
+    workers: int | None = None,
+    chunk_size: int = 1024
+) -> np.ndarray:
+    """
+    compute_hog_features on a process pool, in chunks of chunk_size images.
+    """
+    if len(images) <= chunk_size:
+        return compute_hog_features(images, pixels_per_cell, cells_per_block)
+    chunks = [(images[i:i + chunk_size], pixels_per_cell, cells_per_block) for i in range(0, len(images), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(_hog_chunk, chunks)))
+
+
+def load_patch_features(
+    patches_path: str,
+    cache_dir: str | None = None,
+    pixels_per_cell: tuple[int, int] = (8, 8),
+    cells_per_block: tuple[int, int] = (2, 2),
+    workers: int | None = None
+) -> np.ndarray:
+    """
+    Load the HOG features of a patch file like positive_patches.npy (N rows of 62*47 pixels).
+
+    The features are computed once and cached as .npy file. The cache is keyed by
+    the path, size and modification time of the patch file and the HOG parameters,
+    so it is rebuilt when the patches or the parameters change.
+
+    Args:
+        patches_path (str): Path of the .npy patch file
+        cache_dir (str, optional): Directory for the cached features, default is
+            a hog_cache directory next to the patch file
+        pixels_per_cell (tuple[int, int]): HOG cell size
+        cells_per_block (tuple[int, int]): HOG block size in cells
+        workers (int, optional): Number of processes, default is the number of CPUs
+
+    Returns:
+        np.ndarray: (N, F) array of feature vectors
+    """
+    if not os.path.isfile(patches_path):
+        raise TrainingError(f"Could not load patches from path: {patches_path}")
+    stat = os.stat(patches_path)
+    key = repr((os.path.abspath(patches_path), stat.st_size, stat.st_mtime_ns, tuple(pixels_per_cell), tuple(cells_per_block)))
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(patches_path)), "hog_cache")
+    name = os.path.splitext(os.path.basename(patches_path))[0]
+    cache_path = os.path.join(cache_dir, f"{name}.{digest}.npy")
+    if os.path.isfile(cache_path):
+        return np.load(cache_path)
+
+    # Memory mapped, the patches are only read chunk by chunk by the HOG workers
+    patches = np.load(patches_path, mmap_mode="r")
+    (w, h) = PATCH_SIZE
+    if patches.ndim != 2 or patches.shape[1] != w * h:
+        raise TrainingError(f"patches must have shape (N, {w * h}).")
+    features = compute_hog_features_parallel(patches.reshape(-1, h, w), pixels_per_cell, cells_per_block, workers)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written under a temporary name first, so a crash never leaves a half written cache
+    temporary_path = cache_path + ".tmp.npy"
+    np.save(temporary_path, features)
+    os.replace(temporary_path, cache_path)
+    return features
+
+
+# Training and test data of a sweep worker, memory-mapped once per process by _init_worker
+_worker_data = {}
+
+
+def _init_worker(paths: dict[str, str]):
+    for name, path in paths.items():
+        _worker_data[name] = np.load(path, mmap_mode="r")
+
+
+def _fit(args):
+    (name, estimator) = args
+    (X_train, y_train, X_test, y_test) = (_worker_data[key] for key in ("X_train", "y_train", "X_test", "y_test"))
+    # Imported in the worker, the parent only needs scikit-learn for the grid
+    from sklearn.metrics import precision_score, recall_score
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+    predicted = estimator.predict(X_test)
+    return {
+        "name": name,
+        "precision": float(precision_score(y_test, predicted, zero_division=0)),
+        "recall": float(recall_score(y_test, predicted, zero_division=0)),
+        "fit_s": fit_s,
+        "model": estimator,
+    }
+
+
+def measure_throughput(model, features: np.ndarray, batch_size: int = 4096, repeat: int = 3) -> float:
+    """
+    Measure how many windows per second a model scores, in batches like a sliding window detector.
+
+    Args:
+        model: Fitted model with decision_function or predict
+        features (np.ndarray): (N, F) feature vectors to score
+        batch_size (int): Windows per call
+        repeat (int): Passes over the features, the fastest one counts
+
+    Returns:
+        float: Windows per second
+    """
+    if len(features) == 0:
+        raise TrainingError("features must not be empty.")
+    score = getattr(model, "decision_function", None) or model.predict
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(0, len(features), batch_size):
+            score(features[i:i + batch_size])
+        best = min(best, time.perf_counter() - start)
+    return len(features) / max(best, 1e-9)
+
+
+def sweep(
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    grid: list[tuple[str, object]] | None = None,
+    workers: int | None = None,
+    batch_size: int = 4096,
+    repeat: int = 3
+) -> list[dict]:
+    """
+    Train every model of the grid in parallel and evaluate it on the test set.
+
+    The models are fitted on a process pool, one model per core. The features are
+    written to temporary .npy files once and memory-mapped by every worker. The prediction
+    throughput is then measured in this process, one model after another, so the
+    timings are not distorted by the other models training at the same time.
+
+    Args:
+        X_train, y_train: Training features and labels (1 = face, 0 = no face)
+        X_test, y_test: Test features and labels
+        grid (list, optional): (name, unfitted estimator) pairs, default is default_grid()
+        workers (int, optional): Number of processes, default is the number of CPUs
+        batch_size (int): Windows per prediction call when measuring the throughput
+        repeat (int): Passes over the test set when measuring the throughput
+
+    Returns:
+        list[dict]: One result per model with the keys of RESULT_COLUMNS and the fitted "model",
+            fastest first
+    """
+    grid = default_grid() if grid is None else grid
+    if not grid:
+        raise TrainingError("grid must not be empty.")
+    # The data goes to the workers as memory-mapped files instead of being pickled for
+    # every job, so all processes share one copy through the page cache
+    with tempfile.TemporaryDirectory(prefix="sweep") as directory:
+        paths = {}
+        for key, array in (("X_train", X_train), ("y_train", y_train), ("X_test", X_test), ("y_test", y_test)):
+            paths[key] = os.path.join(directory, key + ".npy")
+            np.save(paths[key], array)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(paths,)) as pool:
+            results = list(pool.map(_fit, grid))
+    for result in results:
+        result["windows_per_s"] = measure_throughput(result["model"], X_test, batch_size, repeat)
+    results.sort(key=lambda result: -result["windows_per_s"])
+    return results
+
+
+def select_model(results: list[dict], target_recall: float = 0.95) -> dict:
+    """
+    Return the fastest result that reaches the target recall. Among equally fast
+    models the more precise one wins.
+    """
+    candidates = [result for result in results if result["recall"] >= target_recall]
+    if not candidates:
+        best = max((result["recall"] for result in results), default=0.0)
+        raise TrainingError(f"No model reaches a recall of {target_recall}, the best recall is {best:.3f}.")
+    return max(candidates, key=lambda result: (result["windows_per_s"], result["precision"]))
+
+
+def export_model(model, path: str, pixels_per_cell: tuple[int, int] = (8, 8), cells_per_block: tuple[int, int] = (2, 2)) -> str:
+    """
+    Save a fitted model in the most compact form available.
+
+    Linear models are saved as weight vector and bias (.npz, see LinearDetector),
+    all other models are pickled (.pkl).
+
+    Returns:
+        str: Path of the written file
+    """
+    try:
+        detector = LinearDetector.from_estimator(model, pixels_per_cell, cells_per_block)
+    except TrainingError:
+        detector = None
+    base = os.path.splitext(path)[0]
+    if detector is not None:
+        path = base + ".npz"
+        detector.save(path)
+    else:
+        path = base + ".pkl"
+        with open(path, "wb") as f:
+            pickle.dump(model, f)
+    return path
+
+
+def load_model(path: str):
+    """
+    Load a model written by export_model. Only load pickled models from trusted sources.
+    """
+    if path.endswith(".npz"):
+        return LinearDetector.load(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def format_result(result: dict) -> str:
+    return (
+        f"{result['name']:<24} precision {result['precision']:.3f}  recall {result['recall']:.3f}  "
+        f"{result['windows_per_s']:>12,.0f} windows/s  fit {result['fit_s']:.2f} s"
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train the face classifiers in parallel and export the fastest one with enough recall.")
+    parser.add_argument("--positive", default="data/positive_patches.npy", help="Face patches, (N, 62*47) .npy file")
+    parser.add_argument("--negative", default="data/negative_patches.npy", help="Non-face patches, (N, 62*47) .npy file")
+    parser.add_argument("--cache-dir", help="Directory for the cached HOG features")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Minimum recall of the exported model")
+    parser.add_argument("--output", default="face_detector", help="Path of the exported model, the extension is added")
+    parser.add_argument("--workers", type=int, help="Number of processes, default is the number of CPUs")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Share of the patches used for testing")
+    args = parser.parse_args(argv)
+
+    from sklearn.model_selection import train_test_split
+    positive = load_patch_features(args.positive, args.cache_dir, workers=args.workers)
+    negative = load_patch_features(args.negative, args.cache_dir, workers=args.workers)
+    X = np.vstack((positive, negative))
+    y = np.hstack((np.ones(len(positive), dtype=np.int64), np.zeros(len(negative), dtype=np.int64)))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42, stratify=y)
+
+    results = sweep(X_train, y_train, X_test, y_test, workers=args.workers)
+    for result in results:
+        print(format_result(result))
+    try:
+        best = select_model(results, args.target_recall)
+    except TrainingError as e:
+        print(e, file=sys.stderr)
+        return 1
+    path = export_model(best["model"], args.output)
+    print(f"Exported {best['name']} to {path}")
+    return 0
+
+
+# Access point for the model sweep, e.g.
+# python training.py --positive data/positive_patches.npy --negative data/negative_patches.npy --target-recall 0.97
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+
+
+class TransformError(Exception):
+    pass
+
+
+# Canvas modes of a rotation
+EXPAND = "expand"  # the canvas grows so the whole rotated image fits
+FIT = "fit"  # the canvas keeps its size and the image is scaled down to fit
+CANVAS_MODES = (EXPAND, FIT)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Above this many output pixels the remap tables no longer fit in the CPU caches
+# and cv2.warpAffine, which computes the coordinates on the fly, is faster
+DEFAULT_MAX_REMAP_PIXELS = 640 * 480
+DEFAULT_MAX_ENTRIES = 4096
+# Python objects around each entry (key tuple, Transform, array headers, dict node),
+# about 480 bytes measured with tracemalloc, rounded up. Without it, entries without
+# remap tables would look almost free.
+ENTRY_OVERHEAD = 512
+
+# Fixed-point precision of cv2.warpAffine: coordinates with 10 fractional bits,
+# of which 5 select the bilinear interpolation weights
+_AB_BITS = 10
+_AB_SCALE = 1 << _AB_BITS
+_INTER_BITS = 5
+_ROUND_DELTA = _AB_SCALE >> (_INTER_BITS + 1)
+
+
+class Transform:
+    """
+    A precomputed geometric transform for one input size.
+
+    Attributes:
+        matrix (np.ndarray): 2x3 affine matrix
+        size (tuple[int, int]): Output size as (width, height)
+        maps (tuple[np.ndarray, np.ndarray] | None): Fixed-point remap tables from
+            cv2.convertMaps, or None if the transform is applied with cv2.warpAffine
+    """
+    __slots__ = ("matrix", "size", "maps")
+
+    def __init__(self, matrix: np.ndarray, size: tuple[int, int], maps=None):
+        self.matrix = matrix
+        self.size = size
+        self.maps = maps
+
+    @property
+    def nbytes(self) -> int:
+        if self.maps is None:
+            return ENTRY_OVERHEAD + self.matrix.nbytes
+        return ENTRY_OVERHEAD + self.matrix.nbytes + self.maps[0].nbytes + self.maps[1].nbytes
+
+    def apply(self, image: np.ndarray, border_value=(0, 0, 0), dst: np.ndarray | None = None) -> np.ndarray:
+        """
+        Apply the transform with bilinear interpolation and a constant border.
+        """
+        if self.maps is not None:
+            return cv2.remap(image, self.maps[0], self.maps[1], cv2.INTER_LINEAR, dst=dst, borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
+        return cv2.warpAffine(image, self.matrix, self.size, dst=dst, borderValue=border_value)
+
+
+def rotation_matrix(shape: tuple[int, ...], angle: float, scale: float = 1.0, canvas: str = EXPAND) -> tuple[np.ndarray, tuple[int, int]]:
+    """
+    Compute the affine matrix and output size of a clockwise rotation around the image center.
+
+    Args:
+        shape (tuple): Shape of the input image, (height, width, ...)
+        angle (float): rotation angle in degrees of a 360 degree circle
+        scale (float): Additional scale factor
+        canvas (str): EXPAND or FIT, see CANVAS_MODES
+
+    Returns:
+        tuple[np.ndarray, tuple[int, int]]: The 2x3 matrix and the output size as (width, height)
+    """
+    (h, w) = shape[:2]
+    (cX, cY) = (w // 2, h // 2)
+    # Note that OpenCV uses a clockwise angle convention, hence the negative sign
+    M = cv2.getRotationMatrix2D((cX, cY), -angle, scale)
+    # Size of the box around the rotated image, based on the unscaled rotation
+    # cf. https://math.stackexchange.com/questions/430763/size-of-new-box-rotated-and-the-rescaled
+    cos = np.abs(M[0, 0]) / scale
+    sin = np.abs(M[0, 1]) / scale
+    rotW = (w * cos) + (h * sin)
+    rotH = (w * sin) + (h * cos)
+    if canvas == EXPAND:
+        (nW, nH) = (int(rotW * scale), int(rotH * scale))
+        # Move the center of the image to the center of the new canvas
+        M[0, 2] += (nW / 2) - cX
+        M[1, 2] += (nH / 2) - cY
+    elif canvas == FIT:
+        # The smaller factor ensures the entire image fits
+        M = cv2.getRotationMatrix2D((cX, cY), -angle, scale * min(w / rotW, h / rotH))
+        (nW, nH) = (w, h)
+    else:
+        raise TransformError(f"canvas must be one of {CANVAS_MODES}.")
+    return M, (nW, nH)
+
+
+def build_maps(matrix: np.ndarray, size: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build the fixed-point remap tables of an affine transform.
+
+    The coordinates are rounded the way cv2.warpAffine rounds them internally
+    (10 fractional bits per row and column term, then 5 bits for the interpolation
+    table), so cv2.remap with these tables gives exactly the pixels of cv2.warpAffine.
+
+    Args:
+        matrix (np.ndarray): 2x3 affine matrix from input to output coordinates
+        size (tuple[int, int]): Output size as (width, height)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Integer coordinates (CV_16SC2) and interpolation
+            table indices (CV_16UC1), 6 bytes per output pixel
+    """
+    (nW, nH) = size
+    M = cv2.invertAffineTransform(matrix)
+    xs = np.arange(nW, dtype=np.float64)
+    ys = np.arange(nH, dtype=np.float64)[:, None]
+    # Column terms per x, row terms per y, as in OpenCV's WarpAffineInvoker
+    x_delta = np.rint(M[0, 0] * xs * _AB_SCALE).astype(np.int32)
+    y_delta = np.rint(M[1, 0] * xs * _AB_SCALE).astype(np.int32)
+    x_row = np.rint((M[0, 1] * ys + M[0, 2]) * _AB_SCALE).astype(np.int32) + _ROUND_DELTA
+    y_row = np.rint((M[1, 1] * ys + M[1, 2]) * _AB_SCALE).astype(np.int32) + _ROUND_DELTA
+    X = (x_row + x_delta) >> (_AB_BITS - _INTER_BITS)
+    Y = (y_row + y_delta) >> (_AB_BITS - _INTER_BITS)
+    coordinates = np.clip(np.stack((X >> _INTER_BITS, Y >> _INTER_BITS), axis=-1), -32768, 32767).astype(np.int16)
+    mask = (1 << _INTER_BITS) - 1
+    fractions = ((Y & mask) << _INTER_BITS | (X & mask)).astype(np.uint16)
+    return coordinates, fractions
+
+
+class TransformCache:
+    """
+    LRU cache of transforms, for applying the same transform to many frames of the same size,
+    e.g. deskewing a video. Evicts the least recently used transforms when the cached transforms
+    take more than max_bytes or there are more than max_entries of them.
+
+    A new transform is applied with cv2.warpAffine. The remap tables are only built when the
+    same transform is used a second time, so one-off transforms (e.g. stabilisation, where
+    the angle changes every frame) don't pay for tables they never reuse.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_remap_pixels: int = DEFAULT_MAX_REMAP_PIXELS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            max_bytes (int): Memory budget for the cached transforms
+            max_remap_pixels (int): Only build remap tables for outputs up to this many pixels,
+                larger ones are applied with cv2.warpAffine. 0 disables the remap tables.
+            max_entries (int): Maximum number of cached transforms
+        """
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise TransformError("max_bytes must be a non-negative integer.")
+        if not isinstance(max_remap_pixels, int) or max_remap_pixels < 0:
+            raise TransformError("max_remap_pixels must be a non-negative integer.")
+        if not isinstance(max_entries, int) or max_entries < 0:
+            raise TransformError("max_entries must be a non-negative integer.")
+        self.max_bytes = max_bytes
+        self.max_remap_pixels = max_remap_pixels
+        self.max_entries = max_entries
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def get(self, key: tuple, build) -> Transform:
+        """
+        Return the transform for key, calling build() -> (matrix, size) if it is not cached.
+        """
+        with self._lock:
+            transform = self._entries.get(key)
+            if transform is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if transform is None:
+            # Built outside the lock, so other threads can use the cache meanwhile
+            (matrix, size) = build()
+            transform = Transform(matrix, size)
+            self._store(key, transform)
+            return transform
+        (w, h) = transform.size
+        # Second use: the transform is being reused, now the tables pay off.
+        # 6 bytes per pixel, tables that could never be cached are not built at all.
+        if transform.maps is None and w * h <= self.max_remap_pixels and transform.nbytes + 6 * w * h <= self.max_bytes:
+            transform = Transform(transform.matrix, transform.size, build_maps(transform.matrix, transform.size))
+            self._store(key, transform)
+        return transform
+
+    def _store(self, key: tuple, transform: Transform):
+        if transform.nbytes > self.max_bytes or self.max_entries == 0:
+            # Would evict everything else, use it once without caching
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[key] = transform
+            self.nbytes += transform.nbytes
+            while self.nbytes > self.max_bytes or len(self._entries) > self.max_entries:
+                (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def rotation(self, shape: tuple[int, ...], angle: float, scale: float = 1.0, canvas: str = EXPAND) -> Transform:
+        """
+        Return the cached rotation for an input shape, see rotation_matrix.
+        """
+        if canvas not in CANVAS_MODES:
+            raise TransformError(f"canvas must be one of {CANVAS_MODES}.")
+        (h, w) = shape[:2]
+        key = ("rotation", h, w, float(angle), float(scale), canvas)
+        return self.get(key, lambda: rotation_matrix(shape, angle, scale, canvas))
+
+
+# Shared cache for the whole process
+transform_cache = TransformCache()
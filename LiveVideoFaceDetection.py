@@ -1,9 +1,13 @@
 import cv2
+import os
+import sys
 
-face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+# The classifier registry lives next to the ImageProcessor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ImageProcessor"))
+from classifiers import get_cascade
 
 def detect_faces(image):
-    boxes = face_cascade(image)
+    boxes = get_cascade().detectMultiScale(image)
     return boxes
 
 
@@ -31,7 +35,7 @@ while True:
     if not ret:
         break  # Stop if frame not read correctly
 
-    faces = face_cascade.detectMultiScale(frame, scaleFactor=1.1, minNeighbors=5, minSize=min_face_size)
+    faces = get_cascade().detectMultiScale(frame, scaleFactor=1.1, minNeighbors=5, minSize=min_face_size)
 
     # Enumerate faces to label them
     for face in faces:
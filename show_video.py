@@ -1,10 +1,15 @@
 import cv2
+import os
+import sys
 import time
 
+# The instrumentation and the classifier registry live next to the ImageProcessor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ImageProcessor"))
+from instrumentation import metrics
+# The face cascade is only parsed on the first call of find_faces
+from classifiers import get_cascade
 
 
-face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
-
 
 def draw_faces(frame, faces):
     for face in faces:
@@ -38,17 +43,20 @@ def draw_faces(frame, faces):
 
 def find_faces(frame, scale_factor):
     # Convert frame to grayscale for face detection
-    prepped_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    with metrics.stage("video.cvtColor"):
+        prepped_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     # Resize frame for faster processing by scale_factor
-    prepped_frame = cv2.resize(prepped_frame, (0, 0), fx=scale_factor, fy=scale_factor)
+    with metrics.stage("video.resize"):
+        prepped_frame = cv2.resize(prepped_frame, (0, 0), fx=scale_factor, fy=scale_factor)
     # Detect faces in the prepped frame
     # Keep ScaleFactor low to ensure not to miss faces (reduce "false negatives")
     # But increase minNeighbors to reduce false positives
-    faces = face_cascade.detectMultiScale(
-        prepped_frame, 
-        scaleFactor=1.1, 
-        minNeighbors=5
-        )   
+    with metrics.stage("video.detectMultiScale"):
+        faces = get_cascade().detectMultiScale(
+            prepped_frame, 
+            scaleFactor=1.1, 
+            minNeighbors=5
+            )   
     # Scale face coordinates back to original frame size
     scaled_faces = []
     for (x, y, w, h) in faces:
@@ -131,6 +139,7 @@ def start_feed(video_path, target_resolution=640, frame_skip_rate=5):
     # Run the face detection on 640 pixels width to get real time speed. The height will be scaled accordingly to maintain aspect ratio.
     frame_scale_factor = min(1, target_resolution/width)
     print("Video FPS:", video_fps)
+    frame_interval = 1 / video_fps if video_fps > 0 else float("inf")
     print(f"Video resolution: {width} x {height}")
     print(f"Scaling video to {min(target_resolution, width)} pixels width for real-time processing. Factor: ", frame_scale_factor)
     print("Press 'q' to quit.")
@@ -145,35 +154,48 @@ def start_feed(video_path, target_resolution=640, frame_skip_rate=5):
 
     
     while True:
+        # Checked once per frame, so enabling the metrics mid-frame can't skip frame_start
+        timing = metrics.enabled
+        if timing:
+            frame_start = time.perf_counter()
         # Read a frame
-        ret, frame = cap.read()
+        with metrics.stage("video.read"):
+            ret, frame = cap.read()
 
         # If frame not read correctly, break loop
         if not ret:
             break
+        metrics.increment("frames_read")
 
         # Find faces every frame_skip_rate frames to improve permformance
         if frame_id % frame_skip_rate == 0:  
             faces = find_faces(frame, frame_scale_factor)
-            face_tracker = identify_valid_faces(face_tracker, faces)
-            faces = [face for (face, count) in face_tracker if count > 2]
+            with metrics.stage("video.tracking"):
+                face_tracker = identify_valid_faces(face_tracker, faces)
+                faces = [face for (face, count) in face_tracker if count > 2]
+        else:
+            # Detection was dropped for this frame, the boxes of the last detection are reused
+            metrics.increment("frames_detection_skipped")
+        metrics.set_gauge("tracked_faces", len(face_tracker))
 
 
 
         # Still, draw boxes on every frame to avoid blinking effect when skipping face detection
-        frame = draw_faces(frame, faces)
-        # Print Frame ID and number of faces detected on the frame
-        cv2.putText(frame,
-            f"Frame: {frame_id} * Number of Faces: {len(faces)}",
-            (50, 50),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            1,
-            (0, 255, 0),
-            2,
-            cv2.LINE_AA)
+        with metrics.stage("video.draw"):
+            frame = draw_faces(frame, faces)
+            # Print Frame ID and number of faces detected on the frame
+            cv2.putText(frame,
+                f"Frame: {frame_id} * Number of Faces: {len(faces)}",
+                (50, 50),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1,
+                (0, 255, 0),
+                2,
+                cv2.LINE_AA)
 
         # Display the frame
-        cv2.imshow("Video", frame)
+        with metrics.stage("video.imshow"):
+            cv2.imshow("Video", frame)
 
         #Press 'q' to quit
         # Minimising the wait time to achieve real-time performance
@@ -181,6 +203,13 @@ def start_feed(video_path, target_resolution=640, frame_skip_rate=5):
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
+        # A frame that took longer than the video frame interval means the next frames arrive late
+        if timing:
+            frame_time = time.perf_counter() - frame_start
+            metrics.observe("video.frame", frame_time)
+            if frame_time > frame_interval:
+                metrics.increment("frames_late")
+
         frame_id += 1
     end_time = time.time()
     elapsed_time = end_time - start_time
@@ -194,4 +223,8 @@ if __name__ == "__main__":
 
     # Path to your .mov file
     video_path = "data/IMG_0992.mov"
+    # Optional: set CV_METRICS=1 and scrape http://127.0.0.1:9100/metrics while the video runs
+    if metrics.enabled:
+        metrics.start_http_server(9100)
+        metrics.start_json_logger(interval=10)
     start_feed(video_path, target_resolution=800, frame_skip_rate=1)
\ No newline at end of file